@@ -1,4 +1,4 @@
-from utils import Tile, Rotation, Command
+from utils import Tile, Rotation, TURN_COMMANDS
 from map import Map
 from dataclasses import dataclass
 
@@ -20,18 +20,8 @@ class Agent:
         return (self.row, self.col)
     
     def calculate_rotation(self, target_rot):
-        diff = target_rot.value - self.rot.value
-        if diff == 0:
-            return None
-        elif diff in [1, -3]:
-            return Command.RIGHT
-        elif diff in [-1, 3]:
-            return Command.LEFT
-        elif abs(diff) == 2: 
-            return Command.BACK
-        else:
-            raise Exception("Rotation diff incorrect")
-        
+        return TURN_COMMANDS[(target_rot.value - self.rot.value) % 4]
+
     @staticmethod
     def from_string(string):
         data = string.split()
@@ -0,0 +1,114 @@
+from agent import Agent
+
+
+# Agents of one turn stored as parallel arrays, reused between turns.
+# batch[id] returns a slotted view with the Agent interface, so code
+# written for Agent objects keeps working.
+class AgentBatch:
+    def __init__(self):
+        self.size = 0
+        self.rows = []
+        self.cols = []
+        self.rots = []
+        self.has_gold = []
+        self.tiles = []
+        self.dists = []
+        self.views = []
+
+    def resize(self, size):
+        while len(self.views) < size:
+            self.rows.append(0)
+            self.cols.append(0)
+            self.rots.append(None)
+            self.has_gold.append(False)
+            self.tiles.append(None)
+            self.dists.append(0)
+            self.views.append(AgentView(self, len(self.views)))
+        self.size = size
+
+    def set(self, id, row, col, rot, tile, dist, has_gold):
+        self.rows[id] = row
+        self.cols[id] = col
+        self.rots[id] = rot
+        self.tiles[id] = tile
+        self.dists[id] = dist
+        self.has_gold[id] = has_gold
+
+    # copy a list of Agent objects into the batch
+    def load(self, agents):
+        self.resize(len(agents))
+        for id, agent in enumerate(agents):
+            self.set(id, agent.row, agent.col, agent.rot, agent.vision.tile, agent.vision.dist, agent.has_gold)
+        return self
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, id):
+        if id >= self.size:
+            raise IndexError(id)
+        return self.views[id]
+
+    def __iter__(self):
+        return iter(self.views[:self.size])
+
+    # ids of agents without a command, optionally only those carrying
+    # (or not carrying) gold and those seeing a given tile
+    def idle(self, commands, has_gold=None, sees=None):
+        ids = [id for id, command in enumerate(commands) if command is None]
+        if has_gold is not None:
+            gold = self.has_gold
+            ids = [id for id in ids if gold[id] == has_gold]
+        if sees is not None:
+            tiles = self.tiles
+            ids = [id for id in ids if tiles[id] == sees]
+        return ids
+
+    def count_gold(self):
+        return sum(self.has_gold[:self.size])
+
+
+class AgentView:
+    __slots__ = ("batch", "id", "vision")
+
+    def __init__(self, batch, id):
+        self.batch = batch
+        self.id = id
+        self.vision = VisionView(batch, id)
+
+    @property
+    def row(self):
+        return self.batch.rows[self.id]
+
+    @property
+    def col(self):
+        return self.batch.cols[self.id]
+
+    @property
+    def rot(self):
+        return self.batch.rots[self.id]
+
+    @property
+    def has_gold(self):
+        return self.batch.has_gold[self.id]
+
+    def cords(self):
+        return (self.batch.rows[self.id], self.batch.cols[self.id])
+
+    calculate_rotation = Agent.calculate_rotation
+
+
+class VisionView:
+    __slots__ = ("batch", "id")
+
+    def __init__(self, batch, id):
+        self.batch = batch
+        self.id = id
+
+    @property
+    def tile(self):
+        return self.batch.tiles[self.id]
+
+    @property
+    def dist(self):
+        return self.batch.dists[self.id]
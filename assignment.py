@@ -0,0 +1,100 @@
+import math
+
+
+# cost of sending every agent to every target, turns on a cached distance
+# field when the target has one, manhattan distance otherwise
+def cost_matrix(game_map, agents, targets):
+    matrix = []
+    fields = [game_map.fields.get(target) for target in targets]
+    fields = [field if field is not None and not field.stale else None for field in fields]
+    for agent in agents:
+        cords = (agent.row, agent.col)
+        row = []
+        for target, field in zip(targets, fields):
+            if field is not None:
+                row.append(field.distance(cords, agent.rot))
+            else:
+                row.append(abs(cords[0] - target[0]) + abs(cords[1] - target[1]))
+        matrix.append(row)
+    return matrix
+
+
+# minimal cost matching of rows to columns (Hungarian method with potentials)
+# returns column assigned to every row or -1, infinite costs are never matched
+def hungarian(cost):
+    if len(cost) == 0 or len(cost[0]) == 0:
+        return [-1] * len(cost)
+    if len(cost) > len(cost[0]):
+        transposed = hungarian([list(column) for column in zip(*cost)])
+        result = [-1] * len(cost)
+        for col, row in enumerate(transposed):
+            if row >= 0:
+                result[row] = col
+        return result
+    n, m = len(cost), len(cost[0])
+    finite = [value for row in cost for value in row if value != math.inf]
+    big = (max(finite) + 1) * (n + 1) if finite else 1
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            u_i0 = u[i0]
+            delta = math.inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                value = row[j - 1]
+                current = (big if value == math.inf else value) - u_i0 - v[j]
+                if current < minv[j]:
+                    minv[j] = current
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if p[j] != 0 and cost[p[j] - 1][j - 1] != math.inf:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+# returns list of (agent id, target) pairs, at most max_pairs cheapest ones
+# ids are indices into agents, candidates limits which of them may be used
+def assign(game_map, agents, targets, candidates=None, max_pairs=None):
+    if candidates is None:
+        candidates = list(range(len(agents)))
+    if len(candidates) == 0 or len(targets) == 0:
+        return []
+    matrix = cost_matrix(game_map, [agents[id] for id in candidates], targets)
+    matched = hungarian(matrix)
+    pairs = [
+        (matrix[row][col], candidates[row], targets[col])
+        for row, col in enumerate(matched) if col >= 0
+    ]
+    pairs.sort(key=lambda pair: pair[0])
+    if max_pairs is not None:
+        pairs = pairs[:max_pairs]
+    return [(id, target) for _, id, target in pairs]
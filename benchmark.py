@@ -0,0 +1,665 @@
+import os
+import sys
+import tempfile
+import random
+import timeit
+import tracemalloc
+import io
+from queue import Queue
+from collections import deque
+from map import Map
+from numpy_map import NumpyMap, HAS_NUMPY
+from distance_field import DistanceField
+from assignment import assign
+from agent import Agent
+from bot import Bot
+from replay import replay, summary, parse_transcript
+from simulator import Game, InProcessPlayer, ProcessPlayer
+from selfplay import tuned_bot, play_game
+from utils import Tile, Rotation, Command
+from protocol import Protocol
+from agent_batch import AgentBatch
+from parallel_planner import ParallelPlanner
+from game_log import GameLogWriter, GameLogReader
+from rollout import Lookahead, RolloutState
+from flight_recorder import FlightRecorder, read_dump, replay_dump
+from hierarchy import ClusterGraph
+from speculator import Speculator
+from topology import Topology
+
+
+# board with random walls and gold, fog on part of the map
+def random_board(game_map, seed=0, fog=0.5, walls=0.15, gold=0.02):
+    rng = random.Random(seed)
+    for row in range(game_map.n):
+        for col in range(game_map.n):
+            value = rng.random()
+            if value < fog:
+                tile = Tile.FOG
+            elif value < fog + walls:
+                tile = Tile.WALL
+            elif value < fog + walls + gold:
+                tile = Tile.GOLD
+            else:
+                tile = Tile.EMPTY
+            game_map.set_tile(row, col, tile)
+    game_map.publish()
+    return game_map
+
+
+def bench_map(sizes=(50, 100, 200, 400), repeat=20):
+    backends = [Map] + ([NumpyMap] if HAS_NUMPY else [])
+    for n in sizes:
+        for backend in backends:
+            game_map = random_board(backend(n, (0, 0), []))
+            queries = {
+                "count_on_board": lambda: game_map.count_on_board(Tile.FOG),
+                "find_all": lambda: game_map.find_all(Tile.GOLD),
+                "find_closest": lambda: game_map.find_closest(n // 2, n // 2, Tile.GOLD),
+            }
+            for name, query in queries.items():
+                seconds = timeit.timeit(query, number=repeat) / repeat
+                print(f"map n={n:<4} {backend.__name__:<9} {name:<15} {seconds * 1e3:8.3f} ms")
+
+
+# Map.bfs before the pathfinder, kept as reference for the differential check
+def reference_bfs(game_map, start, start_rot, target):
+    if start == target:
+        return None
+    frontier = Queue()
+    frontier.put((start, start_rot))
+    came_from = dict()
+    came_from[(start, start_rot)] = None
+
+    while not frontier.empty():
+        current, current_rot = frontier.get()
+        if current == target:
+            break
+        next_tile = game_map.adjacent(current, current_rot)
+        if (next_tile is not None and
+            game_map.board[next_tile[0]][next_tile[1]] != Tile.WALL and
+            (game_map.agent_board[next_tile[0]][next_tile[1]] != Tile.ALLY or next_tile == target) and
+            (next_tile, current_rot) not in came_from
+        ):
+            frontier.put((next_tile, current_rot))
+            came_from[(next_tile, current_rot)] = (current, current_rot)
+        for rot in Rotation:
+            if rot == current_rot:
+                continue
+            if (current, rot) not in came_from:
+                frontier.put((current, rot))
+                came_from[(current, rot)] = (current, current_rot)
+
+    target_rot = None
+    for rot in Rotation:
+        if (target, rot) in came_from:
+            target_rot = rot
+            break
+    if target_rot is None:
+        return None
+    current = (target, target_rot)
+    while current[0] != start:
+        if came_from[current][0] == start:
+            return current[0]
+        current = came_from[current]
+    raise Exception("Path not reconstructed")
+
+
+# random map with allies on it, returns map and a list of (start, rot, target)
+def random_queries(n, seed, count):
+    rng = random.Random(seed)
+    game_map = random_board(Map(n, (0, 0), []), seed=seed, fog=0.3, walls=0.25)
+    for _ in range(n // 2):
+        row, col = game_map.random_cords()
+        game_map.agent_board[row][col] = Tile.ALLY
+        game_map.ally_mask[row * n + col] = 1
+    queries = []
+    for _ in range(count):
+        start = (rng.randrange(n), rng.randrange(n))
+        target = (rng.randrange(n), rng.randrange(n))
+        queries.append((start, rng.choice(list(Rotation)), target))
+    return game_map, queries
+
+
+def bench_pathfinder(sizes=(32, 64, 128, 256), count=20):
+    for n in sizes:
+        game_map, queries = random_queries(n, 0, count)
+        queries = [q for q in queries if not game_map.walls[q[0][0] * n + q[0][1]]]
+        reference = timeit.timeit(lambda: [reference_bfs(game_map, *q) for q in queries], number=1)
+        expanded = 0
+        start_time = timeit.default_timer()
+        for query in queries:
+            game_map.bfs(*query)
+            expanded += game_map.pathfinder.expanded
+        astar = timeit.default_timer() - start_time
+        print(f"pathfinder n={n:<4} reference bfs {reference / len(queries) * 1e3:8.3f} ms"
+              f"  A* {astar / len(queries) * 1e3:8.3f} ms  expanded {expanded // len(queries)}")
+
+
+def bench_assignment(shapes=((10, 30), (50, 100), (100, 200)), repeat=3):
+    rng = random.Random(0)
+    n = 100
+    game_map = Map(n, (0, 0), [])
+    for n_agents, n_targets in shapes:
+        agents = [
+            Agent(rng.randrange(n), rng.randrange(n), rng.choice(list(Rotation)), None)
+            for _ in range(n_agents)
+        ]
+        targets = [(rng.randrange(n), rng.randrange(n)) for _ in range(n_targets)]
+        seconds = timeit.timeit(lambda: assign(game_map, agents, targets), number=repeat) / repeat
+        print(f"assignment {n_agents:>4} agents x {n_targets:<4} targets {seconds * 1e3:8.3f} ms")
+
+
+# transcript of player 0 in a local self-play game
+def simulated_transcript(n, n_agents, turns, seed=0):
+    Game.MAX_AGENTS, max_agents = n_agents, Game.MAX_AGENTS
+    record = []
+    random.seed(seed)
+    players = [InProcessPlayer(tuned_bot({}), record), InProcessPlayer(tuned_bot({}))]
+    try:
+        Game(n, turns, seed=seed).play(players)
+    finally:
+        Game.MAX_AGENTS = max_agents
+    return parse_transcript(record)
+
+
+def bench_turns(sizes=(32, 64, 96), agent_counts=(5, 20), turns=60):
+    for n in sizes:
+        for n_agents in agent_counts:
+            header, transcript = simulated_transcript(n, n_agents, turns)
+            latencies, _ = replay(header, transcript)
+            tracemalloc.start()
+            replay(header, transcript)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats = summary(latencies)
+            print(f"turns n={n:<4} agents={n_agents:<3} p50 {stats['p50'] * 1e3:8.3f} ms"
+                  f"  p99 {stats['p99'] * 1e3:8.3f} ms  peak memory {peak / 2 ** 20:7.2f} MiB")
+
+
+def bench_selfplay(sizes=(16, 24, 32), games=4, game_length=200):
+    for n in sizes:
+        start = timeit.default_timer()
+        for seed in range(games):
+            play_game((n, game_length, seed, [{}, {}]))
+        elapsed = timeit.default_timer() - start
+        print(f"selfplay n={n:<4} length={game_length} {games / elapsed:6.2f} games/s per core")
+
+
+# parse one turn and write its commands, line by line as main.py used to
+# versus the bulk protocol
+def bench_protocol(agent_counts=(10, 100, 500), turns=200):
+    rng = random.Random(0)
+    for n_agents in agent_counts:
+        lines = [
+            f"{rng.randrange(100)} {rng.randrange(100)} {rng.choice(list(Tile)).name} "
+            f"{rng.randrange(1, 50)} {rng.choice(list(Rotation)).name} {rng.randrange(2)}"
+            for _ in range(n_agents)
+        ]
+        block = f"{n_agents}\n" + "\n".join(lines) + "\n"
+        commands = [rng.choice(list(Command)) for _ in range(n_agents)]
+
+        def line_by_line():
+            stdin = io.StringIO(block * turns)
+            stdout = io.StringIO()
+            for _ in range(turns):
+                agents = [Agent.from_string(stdin.readline()) for _ in range(int(stdin.readline()))]
+                for command in commands:
+                    print(command.name, file=stdout)
+                stdout.flush()
+            return agents
+
+        def bulk(batch=None):
+            protocol = Protocol(io.BytesIO(block.encode() * turns), io.BytesIO())
+            for _ in range(turns):
+                agents = protocol.read_turn(batch)
+                protocol.write_commands(commands)
+            return agents
+
+        old = timeit.timeit(line_by_line, number=1) / turns
+        new = timeit.timeit(bulk, number=1) / turns
+        batch = AgentBatch()
+        batched = timeit.timeit(lambda: bulk(batch), number=1) / turns
+        print(f"protocol agents={n_agents:<4} line by line {old * 1e3:7.3f} ms  bulk {new * 1e3:7.3f} ms"
+              f"  into batch {batched * 1e3:7.3f} ms per turn")
+
+
+# mostly foggy map with a few explored pockets, frontier search versus a
+# distance field over all fog as explore used before
+def bench_explore(sizes=(64, 128, 256), n_agents=20, repeat=3):
+    rng = random.Random(0)
+    for n in sizes:
+        game_map = Map(n, (n // 2, n // 2), [])
+        for _ in range(4):
+            game_map.clear_fog(game_map.random_cords(), 6)
+        known = game_map.find_all(Tile.EMPTY)
+        starts = [rng.choice(known) for _ in range(n_agents)]
+        frontier = timeit.timeit(lambda: game_map.explore_steps(starts), number=repeat) / repeat
+
+        def fog_field():
+            field = DistanceField(n, game_map.find_all(Tile.FOG))
+            field.build(game_map.walls)
+            return [field.next_tile(start, Rotation.U) for start in starts]
+
+        field = timeit.timeit(fog_field, number=repeat) / repeat
+        print(f"explore n={n:<4} frontier {len(game_map.frontier):<5} frontier search {frontier * 1e3:8.3f} ms"
+              f"  fog distance field {field * 1e3:8.3f} ms")
+
+
+def bench_rays(sizes=(32, 64, 128), count=2000):
+    for n in sizes:
+        game_map = Map(n, (n // 2, n // 2), [])
+        random_board(game_map, seed=n)
+        rng = random.Random(n)
+        queries = [(rng.randrange(n), rng.randrange(n), rng.choice(list(Rotation))) for _ in range(count)]
+
+        def scan():
+            found = 0
+            for row, col, rot in queries:
+                for _, tile in game_map.line(row, col, rot):
+                    if tile == Tile.FOG:
+                        found += 1
+                        break
+                    if tile != Tile.EMPTY:
+                        break
+            return found
+
+        def rays():
+            return sum(game_map.fog_in_sight(row, col, rot) for row, col, rot in queries)
+
+        assert scan() == rays()
+        old = timeit.timeit(scan, number=3) / 3
+        new = timeit.timeit(rays, number=3) / 3
+        print(f"rays n={n:<4} {count} fog checks  line scan {old * 1e3:8.3f} ms  ray slices {new * 1e3:8.3f} ms")
+
+
+def bench_camps(sizes=(32, 64, 128), repeat=5):
+    for n in sizes:
+        bot = Bot(n, 1000, 2, (2, 2), [(n - 3, n - 3)])
+        random_board(bot.map, seed=n)
+        camps = bot.map.camp_map()
+
+        def full():
+            camps.dirty_rows = set(range(n))
+            camps.dirty_cols = set(range(n))
+            bot.map.camp_map()
+
+        def changed():
+            row, col = bot.map.random_cords()
+            bot.map.set_tile(row, col, Tile.WALL if bot.map.board[row][col] != Tile.WALL else Tile.EMPTY)
+            bot.map.publish()
+            bot.map.camp_map()
+
+        golds = bot.map.find_all(Tile.GOLD)
+        full_time = timeit.timeit(full, number=repeat) / repeat
+        changed_time = timeit.timeit(changed, number=repeat) / repeat
+        guard_time = timeit.timeit(lambda: [bot.guard_location(gold) for gold in golds], number=repeat) / repeat
+        print(f"camps n={n:<4} full scan {full_time * 1e3:8.3f} ms  one tile {changed_time * 1e3:8.3f} ms"
+              f"  guard {len(golds):<4} golds {guard_time * 1e3:8.3f} ms")
+
+
+def bench_danger(sizes=(32, 64, 128), sightings=5, repeat=3):
+    for n in sizes:
+        game_map = Map(n, (n // 2, n // 2), [])
+        random_board(game_map, seed=n, fog=0.1)
+        rng = random.Random(n)
+        game_map.heat.start_turn()
+        for _ in range(sightings):
+            game_map.heat.seen(rng.randrange(n * n))
+        game_map.heat.refresh()
+        field = DistanceField(n, [game_map.my_base])
+        plain = timeit.timeit(lambda: field.build(game_map.walls), number=repeat) / repeat
+        weighted = timeit.timeit(lambda: field.build_weighted(game_map.walls, game_map.heat.danger), number=repeat) / repeat
+        danger_cells = sum(1 for cell in range(n * n) if game_map.heat.danger[cell])
+        # one turn of decay repaired into the field
+        repairs = []
+        for _ in range(repeat):
+            field.build_weighted(game_map.walls, game_map.heat.danger)
+            game_map.heat.start_turn()
+            game_map.heat.refresh()
+            repairs.append(timeit.timeit(
+                lambda: field.set_danger(game_map.heat.changed, game_map.walls, game_map.heat.danger), number=1))
+        repair = sum(repairs) / repeat
+        print(f"danger n={n:<4} {danger_cells:<4} cells in line of fire  bfs field {plain * 1e3:8.3f} ms"
+              f"  bucket queue field {weighted * 1e3:8.3f} ms  decay repair {repair * 1e3:8.3f} ms")
+
+
+def bench_update(sizes=(32, 64, 128), n_agents=20, turns=40):
+    for n in sizes:
+        header, lines = simulated_transcript(n, n_agents, turns, seed=1)
+        game_map = Map(n, header[3], header[4])
+        total = 0.0
+        changed = 0
+        for turn in lines:
+            agents = [Agent.from_string(line) for line in turn]
+            start = timeit.default_timer()
+            changes = game_map.update(agents)
+            total += timeit.default_timer() - start
+            changed += len(changes.tiles)
+        print(f"update n={n:<4} agents={n_agents:<3} {total / len(lines) * 1e3:8.3f} ms per turn"
+              f"  {changed / len(lines):6.1f} changed tiles per turn")
+
+
+def bench_planner(sizes=(128, 256), count=64, worker_counts=(1, 2, 4, 8)):
+    for n in sizes:
+        game_map, queries = random_queries(n, 0, count)
+        queries = [q for q in queries if not game_map.walls[q[0][0] * n + q[0][1]] and q[0] != q[2]]
+        start_time = timeit.default_timer()
+        serial = [game_map.bfs(*query) for query in queries]
+        elapsed = timeit.default_timer() - start_time
+        print(f"planner n={n:<4} {len(queries)} searches  serial    {elapsed * 1e3:9.3f} ms")
+        for workers in worker_counts:
+            planner = ParallelPlanner(n, workers)
+            planner.publish(game_map)
+            # warm up the workers
+            planner.first_steps(queries[:workers])
+            start_time = timeit.default_timer()
+            steps = planner.first_steps(queries)
+            elapsed = timeit.default_timer() - start_time
+            planner.close()
+            assert steps == serial
+            print(f"planner n={n:<4} {len(queries)} searches  workers={workers} {elapsed * 1e3:9.3f} ms")
+
+
+def bench_log(sizes=(32, 64, 128, 256), n_agents=20, turns=40):
+    path = os.path.join(tempfile.mkdtemp(), "game.log")
+    for n in sizes:
+        header, lines = simulated_transcript(n, n_agents, turns, seed=1)
+        game_map = Map(n, header[3], header[4])
+        writer = GameLogWriter(path, n)
+        total = 0.0
+        for turn in lines:
+            agents = [Agent.from_string(line) for line in turn]
+            game_map.update(agents)
+            commands = [Command.GO] * len(agents)
+            start = timeit.default_timer()
+            writer.write(game_map.tiles, agents, commands)
+            total += timeit.default_timer() - start
+        # readable before close, as after the bot got killed
+        reader = GameLogReader(path)
+        assert len(reader) == len(lines) and reader[len(reader) - 1].board == game_map.tiles
+        reader.close()
+        writer.close()
+        reader = GameLogReader(path)
+        rng = random.Random(n)
+        seeks = [rng.randrange(len(reader)) for _ in range(100)]
+        read = timeit.timeit(lambda: [reader[turn] for turn in seeks], number=1) / len(seeks)
+        assert reader[len(reader) - 1].board == game_map.tiles
+        reader.close()
+        print(f"log n={n:<4} {os.path.getsize(path) / len(lines) / 1024:7.2f} KiB per turn"
+              f"  write {total / len(lines) * 1e3:7.3f} ms  seek and read {read * 1e3:7.3f} ms")
+
+
+def bench_rollout(sizes=(32, 64, 128), n_agents=20, clones=10000, repeat=20):
+    for n in sizes:
+        header, lines = simulated_transcript(n, n_agents, 40, seed=1)
+        game_map = Map(n, header[3], header[4])
+        for turn in lines:
+            agents = [Agent.from_string(line) for line in turn]
+            game_map.update(agents)
+        lookahead = Lookahead(game_map)
+        base_policy, gold_policy = lookahead.policies()
+        root = RolloutState.from_map(game_map, agents)
+        commands = [None] * len(agents)
+        start = timeit.default_timer()
+        for _ in range(repeat):
+            lookahead.rollout(root, commands, base_policy, gold_policy)
+        elapsed = timeit.default_timer() - start
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        states = [root.step(commands) for _ in range(clones)]
+        per_clone = (tracemalloc.get_traced_memory()[0] - before) / clones
+        tracemalloc.stop()
+        del states
+        print(f"rollout n={n:<4} agents={len(agents):<3} {repeat * lookahead.depth / elapsed:9.0f} states/s"
+              f"  {per_clone:6.0f} bytes per stepped clone")
+
+
+# cost of recording one turn, and a dump of the last turns replayed into
+# a fresh Bot must send the same commands
+def bench_trace(sizes=(32, 64, 128), n_agents=20, turns=60):
+    path = os.path.join(tempfile.mkdtemp(), "trace")
+    budget, Bot.TURN_BUDGET = Bot.TURN_BUDGET, None
+    try:
+        for n in sizes:
+            header, transcript = simulated_transcript(n, n_agents, turns, seed=1)
+            recorders = []
+
+            def recorded_bot(*args):
+                bot = Bot(*args)
+                recorders.append(FlightRecorder(path).install(bot))
+                return bot
+            latencies, commands = replay(header, transcript, bot_factory=recorded_bot)
+            recorder = recorders[0]
+            record = read_dump(recorder.dump("benchmark"))
+            replayed = [replayed for _, replayed in replay_dump(record)]
+            recorded = [turn["commands"] for turn in record["turns"]]
+            assert recorded == [[None if command is None else command.name for command in turn]
+                                for turn in commands[-len(recorded):]]
+            same = sum(a == b for a, b in zip(replayed, recorded))
+            agents = [Agent.from_string(line) for line in transcript[-1]]
+            update = recorder.recorded_update(lambda agents: None)
+            command = recorder.recorded_command(lambda: commands[-1])
+            per_turn = timeit.timeit(lambda: (update(agents), command()), number=1000) / 1000
+            print(f"trace n={n:<4} agents={n_agents:<3} turn {sum(latencies) / len(latencies) * 1e3:8.3f} ms"
+                  f"  recording {per_turn * 1e6:6.1f} us per turn"
+                  f"  replayed {same}/{len(recorded)} turns with the same commands")
+    finally:
+        Bot.TURN_BUDGET = budget
+
+
+# steps between cells ignoring rotations, None if unreachable
+def cell_distance(walls, n, start, target):
+    dist = {start: 0}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell == target:
+            return dist[cell]
+        row, col = divmod(cell, n)
+        for next_row, next_col in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+            next_cell = next_row * n + next_col
+            if 0 <= next_row < n and 0 <= next_col < n and not walls[next_cell] and next_cell not in dist:
+                dist[next_cell] = dist[cell] + 1
+                queue.append(next_cell)
+    return None
+
+
+# long routes with a full A* against the cluster graph plus refining the
+# first segment, cold (borders and cluster edges built on the way), warm,
+# and after new walls in 20 clusters. Abstract routes are compared with
+# the shortest ones
+def bench_hierarchy(sizes=(64, 128, 256, 500), count=10, new_walls=20):
+    for n in sizes:
+        rng = random.Random(n)
+        game_map = random_board(Map(n, (0, 0), []), seed=n, fog=0.3, walls=0.2)
+        graph = ClusterGraph(n, game_map.walls)
+        game_map.subscribe(graph.apply)
+        free = [cell for cell in range(n * n) if not game_map.walls[cell]]
+        queries = []
+        while len(queries) < count:
+            start, target = rng.choice(free), rng.choice(free)
+            if Map.dist(divmod(start, n), divmod(target, n)) >= n // 2:
+                queries.append((start, rng.choice(list(Rotation)), target))
+
+        def clustered():
+            for start, start_rot, target in queries:
+                waypoint = graph.waypoint(start, target)
+                if waypoint is not None:
+                    game_map.pathfinder.first_step(game_map.walls, game_map.ally_mask, divmod(start, n),
+                                                   start_rot, divmod(waypoint, n))
+        cold = timeit.timeit(clustered, number=1) / count
+        warm = timeit.timeit(clustered, number=1) / count
+        for _ in range(new_walls):
+            game_map.set_tile(*divmod(rng.choice(free), n), Tile.WALL)
+        game_map.publish()
+        repaired = timeit.timeit(clustered, number=1) / count
+        full = timeit.timeit(lambda: [game_map.pathfinder.search(game_map.walls, game_map.ally_mask, divmod(start, n),
+                                                                 start_rot, divmod(target, n))
+                                      for start, start_rot, target in queries], number=1) / count
+        ratios = []
+        for start, _, target in queries:
+            route = graph.route(start, target)
+            exact = cell_distance(game_map.walls, n, start, target)
+            assert (route is None) == (exact is None), (n, start, target)
+            if route is not None:
+                ratios.append(route[0] / max(1, exact))
+        print(f"hierarchy n={n:<4} full A* {full * 1e3:9.3f} ms  clusters cold {cold * 1e3:8.3f} ms"
+              f"  warm {warm * 1e3:8.3f} ms  after {new_walls} walls {repaired * 1e3:8.3f} ms"
+              f"  route {sum(ratios) / max(1, len(ratios)):.3f}x shortest")
+
+
+# command latency with plans speculated between turns, the worker runs to
+# completion as if input took long to arrive. Commands are compared with
+# the same game planned without speculation
+def bench_speculate(sizes=(32, 64, 128), n_agents=20, turns=60):
+    budget, Bot.TURN_BUDGET = Bot.TURN_BUDGET, None
+    try:
+        for n in sizes:
+            header, transcript = simulated_transcript(n, n_agents, turns, seed=1)
+            results = []
+            for speculate in (False, True):
+                random.seed(0)
+                bot = Bot(*header)
+                speculator = Speculator().install(bot) if speculate else None
+                latencies = []
+                all_commands = []
+                for lines in transcript:
+                    if speculator is not None:
+                        speculator.stop()
+                    bot.update([Agent.from_string(line) for line in lines])
+                    start = timeit.default_timer()
+                    commands = bot.command()
+                    latencies.append(timeit.default_timer() - start)
+                    all_commands.append(commands)
+                    if speculator is not None:
+                        speculator.start(commands)
+                        speculator.thread.join()
+                results.append((sum(latencies) / len(latencies), all_commands, speculator))
+            (plain, expected, _), (speculated, commands, speculator) = results
+            speculator.uninstall()
+            report = speculator.report()
+            same = sum(a == b for a, b in zip(expected, commands))
+            print(f"speculate n={n:<4} agents={n_agents:<3} command {plain * 1e3:8.3f} ms"
+                  f"  speculated {speculated * 1e3:8.3f} ms  hit rate {report['hit_rate']:.0%}"
+                  f"  plans used {report['saved'] / len(transcript) * 1e3:7.3f} ms per turn"
+                  f"  same commands {same}/{len(transcript)} turns")
+    finally:
+        Bot.TURN_BUDGET = budget
+
+
+# Bot counting routed agents that neither moved nor turned by the next
+# turn, and the time spent in go_all
+def stall_counting_bot(params, stats):
+    class StallCountingBot(tuned_bot(params)):
+        def update(self, agents):
+            for id, (field, dist) in getattr(self, "routed_dists", dict()).items():
+                if id < len(agents):
+                    agent = agents[id]
+                    stats["routed"] += 1
+                    stats["stalled"] += field.distance((agent.row, agent.col), agent.rot) >= dist
+            self.routed_dists = dict()
+            super().update(agents)
+
+        def go_all(self, agents, commands, pairs, safe=False):
+            # only field targets count, those are the ones both sides plan
+            for id, target in pairs:
+                field = self.map.fields.get(target)
+                agent = agents[id]
+                if field is not None and not field.stale and (agent.row, agent.col) != target:
+                    self.routed_dists[id] = (field, field.distance((agent.row, agent.col), agent.rot))
+            start = timeit.default_timer()
+            commands = super().go_all(agents, commands, pairs, safe)
+            stats["seconds"] += timeit.default_timer() - start
+            stats["turns"] += 1
+            return commands
+    return StallCountingBot
+
+
+# routing one by one against the cooperative planner on crowded maps with
+# narrow corridors, stall rate is the share of agents routed to a field
+# target that got no closer to it, planning time is go_all time per call
+def bench_cooperative(sizes=(24, 32), games=4, game_length=150, windows=(None, 4, 8), n_agents=20, walls=0.3):
+    max_agents, Game.MAX_AGENTS = Game.MAX_AGENTS, n_agents
+    wall_share, Game.WALLS = Game.WALLS, walls
+    try:
+        for n in sizes:
+            for window in windows:
+                stats = {"routed": 0, "stalled": 0, "seconds": 0.0, "turns": 0}
+                score = 0
+                for seed in range(games):
+                    random.seed(seed)
+                    players = [InProcessPlayer(stall_counting_bot({"COOPERATIVE_WINDOW": window}, stats)),
+                               InProcessPlayer(tuned_bot({}))]
+                    score += Game(n, game_length, seed=seed).play(players)[0]
+                print(f"cooperative n={n:<4} window={str(window):<5} stall rate {stats['stalled'] / max(1, stats['routed']):6.1%}"
+                      f"  go_all {stats['seconds'] / max(1, stats['turns']) * 1e3:7.3f} ms  score {score / games:5.2f}")
+    finally:
+        Game.MAX_AGENTS = max_agents
+        Game.WALLS = wall_share
+
+
+# seconds from sending the header to reading the first commands of main.py
+# that the largest size has to stay under with cached tables
+STARTUP_TARGET = 1.0
+
+
+# launches main.py twice per size, first with an empty table cache, then
+# loading what the first launch saved
+def bench_startup(sizes=(200, 500, 1000), target=STARTUP_TARGET):
+    cache = tempfile.mkdtemp()
+    previous = os.environ.get("GRUSH_CACHE")
+    os.environ["GRUSH_CACHE"] = cache
+    try:
+        for n in sizes:
+            seconds = []
+            for _ in range(2):
+                player = ProcessPlayer([sys.executable, os.path.join(os.path.dirname(__file__) or ".", "main.py")])
+                game = Game(n, 10, seed=0)
+                game.spawn()
+                player.start(game.header(0))
+                start = timeit.default_timer()
+                player.turn(game.agent_lines(0))
+                seconds.append(timeit.default_timer() - start)
+                player.stop()
+            Topology.CACHE_DIR = cache
+            built = Topology.build(n)
+            loaded = Topology.load(n)
+            Topology.CACHE_DIR = None
+            assert loaded.ahead == built.ahead and loaded.edges == built.edges, n
+            print(f"startup n={n:<5} first command {seconds[0] * 1e3:8.1f} ms cold"
+                  f"  {seconds[1] * 1e3:8.1f} ms with cached tables")
+        assert seconds[1] < target, (sizes[-1], seconds[1])
+    finally:
+        if previous is None:
+            del os.environ["GRUSH_CACHE"]
+        else:
+            os.environ["GRUSH_CACHE"] = previous
+
+
+SUITES = {
+    "pathfinder": bench_pathfinder,
+    "assignment": bench_assignment,
+    "turns": bench_turns,
+    "selfplay": bench_selfplay,
+    "protocol": bench_protocol,
+    "explore": bench_explore,
+    "map": bench_map,
+    "rays": bench_rays,
+    "camps": bench_camps,
+    "danger": bench_danger,
+    "update": bench_update,
+    "planner": bench_planner,
+    "log": bench_log,
+    "rollout": bench_rollout,
+    "trace": bench_trace,
+    "hierarchy": bench_hierarchy,
+    "speculate": bench_speculate,
+    "cooperative": bench_cooperative,
+    "startup": bench_startup,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(SUITES)
+    for name in names:
+        SUITES[name]()
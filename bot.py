@@ -1,6 +1,13 @@
-from map import Map
+from map import Map, NEEDS_SEARCH
+from numpy_map import NumpyMap, HAS_NUMPY
 from utils import Tile, Rotation, Command
 from agent import Agent
+from agent_batch import AgentBatch
+from assignment import assign
+from scheduler import Scheduler
+from parallel_planner import ParallelPlanner
+from rollout import Lookahead
+from cooperative import CooperativePlanner
 import math
 import random
 import logging
@@ -14,6 +21,31 @@ class Bot:
     CAMPERS = 0.4
     GUARD_PERIMETER = 4
     LEAVE_PERIMETER = 7
+    # seconds of planning per turn, None for no limit. Only the command
+    # phases are timed, update and choosing camps run before the budget
+    # starts, choosing camps only rescans lines changed since last turn
+    TURN_BUDGET = 0.5
+    # relative share of the turn budget for each phase
+    PHASE_SHARES = {
+        "return_gold": 3,
+        "shoot": 0,
+        "explore": 2,
+        "mine": 0,
+        "hold_position": 0,
+        "go_to_camp": 1,
+        "go_to_gold": 3,
+        "lookahead": 2,
+        "default": 0,
+    }
+    # use numpy board from this map size on, None to always use lists
+    NUMPY_MIN_N = 64
+    # worker processes for path searches, None to search in this process
+    PLANNER_WORKERS = None
+    # turns simulated by rollouts for agents left idle, None for random moves
+    LOOKAHEAD_DEPTH = None
+    # turns agents heading to my base and golds plan ahead together, None
+    # to route them one by one
+    COOPERATIVE_WINDOW = None
     
     def __init__(self, n, game_length, n_players, my_base, enemy_bases):
         self.n = n
@@ -21,15 +53,30 @@ class Bot:
         self.n_players = n_players
         self.my_base = my_base
         self.enemy_bases = enemy_bases
-        self.map = Map(n, my_base, enemy_bases)
-        self.agents = []
+        if HAS_NUMPY and self.NUMPY_MIN_N is not None and n >= self.NUMPY_MIN_N:
+            self.map = NumpyMap(n, my_base, enemy_bases)
+        else:
+            self.map = Map(n, my_base, enemy_bases)
+        self.agents = AgentBatch()
         self.camp_locations = []
         self.current_miners = 0
+        self.scheduler = Scheduler(self.TURN_BUDGET, self.PHASE_SHARES)
+        self.planner = None
+        if self.PLANNER_WORKERS:
+            self.planner = ParallelPlanner(n, self.PLANNER_WORKERS)
+        self.lookahead = None
+        if self.LOOKAHEAD_DEPTH:
+            self.lookahead = Lookahead(self.map, self.LOOKAHEAD_DEPTH)
+        self.cooperative = None
+        if self.COOPERATIVE_WINDOW:
+            self.cooperative = CooperativePlanner(self.map, self.COOPERATIVE_WINDOW)
+        # flat mask of the cells within LEAVE_PERIMETER of my base
+        self.base_perimeter = self.map.topology.diamond(my_base, self.LEAVE_PERIMETER)
         # remove fog near the base
-        for row in range(n):
-            for col in range(n):
-                if self.map.dist((row, col), my_base) <= Bot.LEAVE_PERIMETER and self.map.board[row][col] == Tile.FOG:
-                    self.map.board[row][col] = Tile.EMPTY
+        self.map.clear_fog(my_base, self.LEAVE_PERIMETER)
+        # first camp map scan covers the whole board, do it here with the
+        # topology tables so turns only rescan the lines that changed
+        self.map.camp_map()
         
     def prefered_camp_rotations(self):
         rotations = []
@@ -46,157 +93,103 @@ class Bot:
     # returns camp locations for 2 agents
     def guard_location(self, target):
         result = []
-        rotations = self.prefered_camp_rotations()
-        considerd_tiles = set(target)
-        for _ in range(Bot.GUARD_PERIMETER):
-            for tile in considerd_tiles:
-                for neighbour in self.map.adjacent_cords(tile):
-                    considerd_tiles.add(neighbour)
-        # dont camp on target
-        considerd_tiles.remove(target)
-        for rot in rotations:
+        camps = self.map.camp_map()
+        n = self.map.n
+        # known passable tiles around target, dont camp on target
+        considerd_tiles = [
+            (row, col) for row, col in self.map.within(target, self.GUARD_PERIMETER)
+            if (row, col) != target and self.map.board[row][col] not in (Tile.WALL, Tile.FOG)
+        ]
+        for rot in self.prefered_camp_rotations():
             best_score = -math.inf
             best_position = None
             # score = vision + 3*covered sides - dist from target if range > 0
             for tile in considerd_tiles:
-                # calculate vision
-                line = self.map.line_cords(tile[0], tile[1], rot, dist=None)
-                vision = 0
-                for cords in line:
-                    if self.map.board[cords[0]][cords[1]] == Tile.WALL:
-                        break
-                    vision += 1
-                    if self.map.board[cords[0]][cords[1]] == Tile.GOLD:
-                        break
-                # calculate cover
-                cover = 0
-                adjacent = self.map.adjacent_cords(tile)
-                for cords in adjacent:
-                    if self.map.board[cords[0]][cords[1]] == Tile.WALL:
-                        cover += 1
-                # calculate dist from target
-                target_dist = self.map.dist(target, tile)
-                # calculate score
-                score = 0 if vision == 0 else vision + (3*cover) - target_dist
+                score = camps.score(tile[0] * n + tile[1], rot.value, self.map.dist(target, tile))
                 if score > best_score:
                     best_position = tile
                     best_score = score
-            # should't happen
             if best_position is None:
                 continue
             result.append((best_position, rot))
-            considerd_tiles.remove(best_position)
-            # remove tiles in line
-            for cord in self.map.line_cords(best_position[0], best_position[1], rot, dist=None):
-                if cord in considerd_tiles:
-                    considerd_tiles.remove(cord)
+            # remove the tile and tiles in line
+            in_line = set(self.map.line_cords(best_position[0], best_position[1], rot, dist=None))
+            in_line.add(best_position)
+            considerd_tiles = [tile for tile in considerd_tiles if tile not in in_line]
         return result
         
+    # agents is an AgentBatch or a list of Agent
     def update(self, agents):
+        if not isinstance(agents, AgentBatch):
+            agents = self.agents.load(agents)
         self.agents = agents
         self.map.update(agents)
-        self.current_miners = 0
-        for agent in agents:
-            if agent.has_gold:
-                self.current_miners += 1
+        if self.planner is not None:
+            self.planner.publish(self.map)
+        if self.cooperative is not None:
+            self.cooperative.start_turn(agents)
+        self.current_miners = agents.count_gold()
 
-    # If agent can scout by rotating do it. Else go to nearest fog    
+    # If agent can scout by rotating do it. Else go to a frontier cluster,
+    # agents are spread over different clusters
     def explore(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if commands[id] is not None:
-                continue
+        waiting = []
+        for id in agents.idle(commands):
+            agent = agents[id]
             # rotate
             for rot in Rotation:
-                line = self.map.line(agent.row, agent.col, rot, dist=None)
                 # if fog before obstacle, rotate
-                for _, tile in line:
-                    if tile == Tile.FOG:
-                        commands[id] = agent.calculate_rotation(rot)
-                        break
-                    if tile != Tile.EMPTY:
-                        break
-            if commands[id] is not None:
-                continue
-            # go to nearest fog
-            cords, dist = self.map.find_closest(agent.row, agent.col, Tile.FOG)
-            # if cannot find fog command stays None
-            if cords is None:
-                continue
-            commands[id] = self.go(agent, cords)
+                if self.map.fog_in_sight(agent.row, agent.col, rot):
+                    commands[id] = agent.calculate_rotation(rot)
+            if commands[id] is None:
+                waiting.append(id)
+        if len(waiting) == 0:
+            return commands
+        if self.scheduler.deadline.expired():
+            for _ in waiting:
+                self.scheduler.degrade()
+            return commands
+        steps = self.map.explore_steps([agents[id].cords() for id in waiting])
+        # if cannot find fog command stays None
+        for id, next_step in zip(waiting, steps):
+            commands[id] = self.move(agents[id], next_step)
         return commands
 
     # fire if enemy in sight
     def shoot(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if commands[id] is not None:
-                continue
-            # TODO shoot based on agent map instead of vision
-            if agent.vision.tile == Tile.ENEMY and not agent.has_gold:
-                commands[id] = Command.FIRE
+        # TODO shoot based on agent map instead of vision
+        for id in agents.idle(commands, has_gold=False, sees=Tile.ENEMY):
+            commands[id] = Command.FIRE
         return commands
 
-    # go to base if holding gold
+    # send agents without gold to distinct golds
     def go_to_gold(self, agents, commands, max_agents=None):
-        gone = 0
-        golds = self.map.find_all(Tile.GOLD)
-        if len(golds) == 0:
-            return commands
-        for id, agent in enumerate(agents):
-            if max_agents is not None and gone >= max_agents:
-                break
-            if commands[id] is not None or agent.has_gold:
-                continue
-            if random.random() < 0.8:
-                cords, _ = self.map.find_closest(agent.row, agent.col, Tile.GOLD)
-            else:
-                cords = random.choice(golds)
-            # if cannot find fog command stays None
-            if cords is None or cords == self.my_base:
-                continue
-            commands[id] = self.go(agent, cords)
-            gone += 1
-        return commands
+        golds = [gold for gold in self.map.find_all(Tile.GOLD) if gold != self.my_base]
+        candidates = agents.idle(commands, has_gold=False)
+        pairs = assign(self.map, agents, golds, candidates, max_pairs=max_agents)
+        return self.go_all(agents, commands, pairs)
     
     def go_to_closest_golds(self, agents, commands):
-        gone = 0
         golds = self.map.find_all(Tile.GOLD)
         golds.sort(key=lambda x: self.map.dist(x, self.my_base))
-        for gold in golds:
-            if gone >= 2 * Bot.MINERS:
-                break
-            best_id = None
-            best_dist = math.inf
-            for id, agent in enumerate(agents):
-                if commands[id] is not None or agent.has_gold:
-                    continue
-                dist = self.map.dist(agent.cords(), gold)
-                if dist < best_dist:
-                    best_id = id
-                    best_dist = dist
-            if best_id is not None:
-                commands[best_id] = self.go(agent, gold)
-                gone += 1
-        return commands
+        golds = golds[:2 * self.MINERS]
+        candidates = agents.idle(commands, has_gold=False)
+        return self.go_all(agents, commands, assign(self.map, agents, golds, candidates))
     
-    # return gold
+    # return gold, avoiding lines of fire of recently seen enemies
     def return_gold(self, agents, commands):
-        ids_agents = list(enumerate(agents))
-        ids_agents.sort(key=lambda x: self.map.dist((x[1].row, x[1].col), self.my_base))
-        for id, agent in ids_agents:
-            if commands[id] is not None:
-                continue
-            if agent.has_gold:
-                commands[id] = self.go(agent, self.my_base)
-        return commands
+        ids = agents.idle(commands, has_gold=True)
+        rows, cols = agents.rows, agents.cols
+        ids.sort(key=lambda id: self.map.dist((rows[id], cols[id]), self.my_base))
+        return self.go_all(agents, commands, [(id, self.my_base) for id in ids], safe=True)
     
     # mine if on gold
     def mine(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if self.current_miners >= Bot.MINERS:
+        rows, cols = agents.rows, agents.cols
+        for id in agents.idle(commands, has_gold=False):
+            if self.current_miners >= self.MINERS:
                 break
-            if commands[id] is not None:
-                continue
-            if not agent.has_gold and self.map.board[agent.row][agent.col] == Tile.GOLD:
+            if self.map.board[rows[id]][cols[id]] == Tile.GOLD:
                 commands[id] = Command.MINE
                 self.current_miners += 1
         return commands
@@ -204,20 +197,68 @@ class Bot:
     def mine_closest_golds(self, agents, commands):
         golds = self.map.find_all(Tile.GOLD)
         golds.sort(key=lambda x: self.map.dist(x, self.my_base))
+        on_tile = dict()
+        for id in agents.idle(commands, has_gold=False):
+            on_tile.setdefault((agents.rows[id], agents.cols[id]), []).append(id)
         for gold in golds:
-            if self.current_miners >= Bot.MINERS:
-                break
-            for id, agent in enumerate(agents):
-                if commands[id] is not None:
-                    continue
-                if agent.cords() == gold and not agent.has_gold:
-                    commands[id] = Command.MINE
-                    self.current_miners += 1
+            for id in on_tile.get(gold, []):
+                if self.current_miners >= self.MINERS:
+                    return commands
+                commands[id] = Command.MINE
+                self.current_miners += 1
         return commands
 
     # returns action or None
-    def go(self, agent, target):
-        next_step = self.map.bfs((agent.row, agent.col), agent.rot, target)
+    # when the phase deadline expired only cached paths are used
+    # safe routes around danger from the heat map
+    def go(self, agent, target, safe=False):
+        if self.scheduler.deadline.expired():
+            self.scheduler.degrade()
+        path_step = self.map.safe_step if safe else self.map.path_step
+        next_step = path_step((agent.row, agent.col), agent.rot, target, self.scheduler.deadline)
+        return self.move(agent, next_step)
+
+    # go() for every (id, target) pair, searches that fields can't answer run
+    # in the planner pool when there is one. Long routes on large maps go
+    # over the cluster graph like in path_step. Steps are applied in pair
+    # order, so RESERVED conflicts are resolved the same way as calling go()
+    # in a loop
+    # with the cooperative planner the pairs it can plan are routed together
+    def go_all(self, agents, commands, pairs, safe=False):
+        if self.cooperative is not None and not self.scheduler.deadline.expired():
+            pairs = self.cooperative.plan(agents, commands, pairs, safe)
+        if self.planner is None or self.scheduler.deadline.expired():
+            for id, target in pairs:
+                commands[id] = self.go(agents[id], target, safe)
+            return commands
+        steps = []
+        searches = []
+        queries = []
+        for id, target in pairs:
+            agent = agents[id]
+            start = (agent.row, agent.col)
+            if start == target:
+                next_step = None
+            else:
+                # same order as Map.path_step, a built field before the cluster graph
+                clustered = (not safe or self.map.heat.empty()) and self.map.over_clusters(start, target)
+                next_step = NEEDS_SEARCH
+                if not clustered or self.map.has_field(target):
+                    next_step = self.map.field_step(start, agent.rot, target, safe, self.scheduler.deadline)
+                if next_step is NEEDS_SEARCH and clustered:
+                    next_step = self.map.cluster_step(start, agent.rot, target, self.scheduler.deadline)
+            if next_step is NEEDS_SEARCH:
+                searches.append(len(steps))
+                queries.append((start, agent.rot, target))
+            steps.append(next_step)
+        for i, next_step in zip(searches, self.planner.first_steps(queries, self.scheduler.deadline)):
+            steps[i] = next_step
+        for (id, _), next_step in zip(pairs, steps):
+            commands[id] = self.move(agents[id], next_step)
+        return commands
+
+    # returns action leading to adjacent next_step or None
+    def move(self, agent, next_step):
         if next_step is None:
             return None
         if next_step[0] == agent.row - 1:
@@ -234,63 +275,58 @@ class Bot:
             if self.map.agent_board[next_step[0]][next_step[1]] != Tile.EMPTY:
                 # stall if blocked
                 return None
-            self.map.agent_board[next_step[0]][next_step[1]] = Tile.RESERVED
+            self.map.set_agent(next_step[0], next_step[1], Tile.RESERVED)
             return Command.GO
         return agent.calculate_rotation(rot)
     
+    # commands for idle agents chosen by rollouts
+    def look_ahead(self, agents, commands):
+        return self.lookahead.plan(agents, commands, self.scheduler.deadline)
+
     # default behaviour
     def default(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if commands[id] is None:
-                commands[id] = random.choices(
-                    [Command.MINE, Command.GO, Command.LEFT, Command.RIGHT, Command.BACK],
-                    weights=[0.0, 0.50, 0.25, 0.25, 0.0],
-                    k=1,
-                )[0]            
+        for id in agents.idle(commands):
+            commands[id] = random.choices(
+                [Command.MINE, Command.GO, Command.LEFT, Command.RIGHT, Command.BACK],
+                weights=[0.0, 0.50, 0.25, 0.25, 0.0],
+                k=1,
+            )[0]            
         return commands
 
     # go to camp locations
     def go_to_camp(self, agents, commands):
-        for camp_cords, camp_rot in self.camp_locations:
-            if self.map.agent_board[camp_cords[0]][camp_cords[1]] == Tile.ALLY:
-                continue
-            # find closest agent
-            best_dist = -math.inf
-            best_id = None
-            for id, agent in enumerate(agents):
-                if commands[id] is not None:
-                    continue
-                dist = self.map.dist(camp_cords, (agent.row, agent.col))
-                if dist < best_dist:
-                    best_id = id
-                    best_dist = dist
-            if best_id is not None:
-                commands[best_id] = self.go(agents[best_id], camp_cords)
-        return commands
+        camps = [
+            camp_cords for camp_cords, _ in self.camp_locations
+            if self.map.agent_board[camp_cords[0]][camp_cords[1]] != Tile.ALLY
+        ]
+        candidates = agents.idle(commands, has_gold=False)
+        return self.go_all(agents, commands, assign(self.map, agents, camps, candidates))
                 
     # stay in camp locations & rotate properly
     def hold_position(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if commands[id] is None and ((agent.row, agent.col), agent.rot) in self.camp_locations:
+        camp_rotations = dict(self.camp_locations)
+        for id in agents.idle(commands, has_gold=False):
+            agent = agents[id]
+            camp_rot = camp_rotations.get((agent.row, agent.col))
+            if camp_rot is None:
+                continue
+            if agent.rot == camp_rot:
                 commands[id] = Command.MINE
             else:
-                for ((camp_row, camp_col), camp_rot) in self.camp_locations:
-                    if (agent.row, agent.col) == (camp_row, camp_col):
-                        return agent.calculate_rotation(camp_rot)
+                commands[id] = agent.calculate_rotation(camp_rot)
         return commands
     
     # if in LEAVE_PERIMETER go to random tile outside
     def leave_base(self, agents, commands):
-        for id, agent in enumerate(agents):
-            if commands[id] is not None:
-                continue
-            if self.map.dist((agent.row, agent.col), self.my_base) > Bot.LEAVE_PERIMETER:
+        for id in agents.idle(commands):
+            agent = agents[id]
+            if not self.base_perimeter[agent.row * self.n + agent.col]:
                 continue
             if random.random() < 0.85:
                 # randomly choose tile to go to - should succed in max few tries
                 for _ in range(10000):
                     target = (random.randint(0, self.map.n-1), random.randint(0, self.map.n-1))
-                    if self.map.dist(target, self.my_base) > Bot.LEAVE_PERIMETER and self.map.board[target[0]][target[1]] != Tile.WALL:
+                    if not self.base_perimeter[target[0] * self.n + target[1]] and self.map.board[target[0]][target[1]] != Tile.WALL:
                         break
                 commands[id] = self.go(agent, target)
             else:
@@ -302,26 +338,47 @@ class Bot:
                 )[0]            
         return commands
                 
-    # guard furthest gold
+    # guard golds closest to my base, 2 camps per gold until there is a
+    # camp for every camper
     def choose_camp_locations(self):
         self.camp_locations = []
+        campers = int(self.CAMPERS * len(self.agents))
+        if campers == 0:
+            return
         golds = self.map.find_all(Tile.GOLD)
-        golds.sort(key=lambda x: 1)
-        # TODO choose golds to camp on
+        golds.sort(key=lambda x: self.map.dist(x, self.my_base))
+        taken = set()
+        for gold in golds:
+            for cords, rot in self.guard_location(gold):
+                if cords in taken:
+                    continue
+                taken.add(cords)
+                self.camp_locations.append((cords, rot))
+                if len(self.camp_locations) >= campers:
+                    return
     
     def should_explore(self):
-        return (self.map.count_on_board(Tile.FOG) / (self.map.n ** 2)) * Bot.EXPLORE > (1 / self.n_players)
+        return (self.map.count_on_board(Tile.FOG) / (self.map.n ** 2)) * self.EXPLORE > (1 / self.n_players)
     
     def command(self):
         commands = [None for _ in range(len(self.agents))]
-        commands = self.return_gold(self.agents, commands)
-        commands = self.shoot(self.agents, commands)
+        phases = [("return_gold", self.return_gold), ("shoot", self.shoot)]
         if self.should_explore():
-            commands = self.explore(self.agents, commands)
-        # commands = self.leave_base(self.agents, commands)
-        commands = self.mine(self.agents, commands)
-        commands = self.go_to_gold(self.agents, commands)
-        commands = self.explore(self.agents, commands)
-        commands = self.default(self.agents, commands)
+            phases.append(("explore", self.explore))
+        # phases.append(("leave_base", self.leave_base))
+        phases.append(("mine", self.mine))
+        self.choose_camp_locations()
+        if len(self.camp_locations) > 0:
+            phases.append(("hold_position", self.hold_position))
+            phases.append(("go_to_camp", self.go_to_camp))
+        phases.append(("go_to_gold", self.go_to_gold))
+        phases.append(("explore", self.explore))
+        if self.lookahead is not None:
+            phases.append(("lookahead", self.look_ahead))
+        phases.append(("default", self.default))
+        self.scheduler.start_turn([name for name, _ in phases])
+        for name, phase in phases:
+            self.scheduler.start_phase(name)
+            commands = phase(self.agents, commands)
         return commands
   
\ No newline at end of file
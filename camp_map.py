@@ -0,0 +1,79 @@
+from array import array
+from utils import Tile
+
+
+# Camp scores for every tile and rotation over the flat board. vision[cell * 4 + rot]
+# is the number of tiles seen before a wall, a gold tile stops the view and is
+# counted, cover[cell] is the number of walls next to the cell. Only walls and
+# golds change them, so a changed tile marks its row and column and those lines
+# are rescanned in one pass per rotation before the next query.
+class CampMap:
+    COVER_WEIGHT = 3
+
+    def __init__(self, n):
+        self.n = n
+        self.vision = array("i", [0]) * (4 * n * n)
+        self.cover = bytearray(n * n)
+        self.dirty_rows = set(range(n))
+        self.dirty_cols = set(range(n))
+
+    # subscriber of Map change sets
+    def apply(self, changes):
+        for cell, old_tile, tile in changes.tiles:
+            self.changed(cell, old_tile, tile)
+
+    def changed(self, cell, old_tile, tile):
+        if (old_tile == Tile.WALL) != (tile == Tile.WALL):
+            delta = 1 if tile == Tile.WALL else -1
+            row, col = divmod(cell, self.n)
+            if row > 0:
+                self.cover[cell - self.n] += delta
+            if row < self.n - 1:
+                self.cover[cell + self.n] += delta
+            if col > 0:
+                self.cover[cell - 1] += delta
+            if col < self.n - 1:
+                self.cover[cell + 1] += delta
+        if old_tile in (Tile.WALL, Tile.GOLD) or tile in (Tile.WALL, Tile.GOLD):
+            row, col = divmod(cell, self.n)
+            self.dirty_rows.add(row)
+            self.dirty_cols.add(col)
+
+    # cells are ordered starting from the map edge rot looks at
+    def scan(self, cells, rot, tiles):
+        vision = self.vision
+        prev = None
+        for cell in cells:
+            if prev is None:
+                seen = 0
+            else:
+                tile = tiles[prev]
+                if tile == Tile.WALL:
+                    seen = 0
+                elif tile == Tile.GOLD:
+                    seen = 1
+                else:
+                    seen = 1 + vision[prev * 4 + rot]
+            vision[cell * 4 + rot] = seen
+            prev = cell
+
+    # rescan lines marked by changed tiles, tiles is the flat board
+    def refresh(self, tiles):
+        n = self.n
+        for row in self.dirty_rows:
+            cells = range(row * n, row * n + n)
+            self.scan(reversed(cells), 1, tiles)
+            self.scan(cells, 3, tiles)
+        for col in self.dirty_cols:
+            cells = range(col, n * n, n)
+            self.scan(cells, 0, tiles)
+            self.scan(reversed(cells), 2, tiles)
+        self.dirty_rows = set()
+        self.dirty_cols = set()
+
+    # vision + 3 * cover - distance to the guarded target, 0 if nothing is seen
+    def score(self, cell, rot, target_dist):
+        seen = self.vision[cell * 4 + rot]
+        if seen == 0:
+            return 0
+        return seen + self.COVER_WEIGHT * self.cover[cell] - target_dist
@@ -0,0 +1,47 @@
+from utils import Tile
+
+
+# What changed on the board during one turn. Map.set_tile records the
+# tile a cell had before its first change, Map.publish closes the set and
+# hands it to the subscribed caches, which update only the cells listed.
+# Cells are flat indices (row * n + col).
+class ChangeSet:
+    def __init__(self):
+        # cell -> tile before the first change since the last publish
+        self.old = dict()
+        # (cell, old tile, new tile) of cells that really changed, set by close
+        self.tiles = []
+        self.defogged = []
+        self.walls_added = []
+        self.walls_removed = []
+        self.golds_added = []
+        self.golds_removed = []
+        # ally occupancy diff as cords, set by Map.update
+        self.arrived = set()
+        self.left = set()
+
+    def record(self, cell, old_tile):
+        if cell not in self.old:
+            self.old[cell] = Tile(old_tile)
+
+    # tiles is the flat board after the changes
+    def close(self, tiles):
+        for cell, old_tile in self.old.items():
+            tile = Tile(tiles[cell])
+            if tile == old_tile:
+                continue
+            self.tiles.append((cell, old_tile, tile))
+            if old_tile == Tile.FOG:
+                self.defogged.append(cell)
+            if tile == Tile.WALL:
+                self.walls_added.append(cell)
+            elif old_tile == Tile.WALL:
+                self.walls_removed.append(cell)
+            if tile == Tile.GOLD:
+                self.golds_added.append(cell)
+            elif old_tile == Tile.GOLD:
+                self.golds_removed.append(cell)
+        return self
+
+    def empty(self):
+        return len(self.tiles) == 0 and len(self.arrived) == 0 and len(self.left) == 0
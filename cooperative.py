@@ -0,0 +1,254 @@
+from heapq import heappush, heappop
+from utils import Tile, Command, TURN_COMMANDS
+
+
+# states an agent is planned to be in, states[0] at turn first
+class Route:
+    __slots__ = ("target", "first", "states")
+
+    def __init__(self, target, first, states):
+        self.target = target
+        self.first = first
+        # (cell, rotation value) per turn
+        self.states = states
+
+
+# Windowed cooperative A* (WHCA*) for agents heading to fields targets (my
+# base and golds). Agents are planned one after another over (cell,
+# rotation, time) for the next window turns, each against a space-time
+# reservation table holding the routes of the agents planned before it.
+# The simulator moves agents in random order, so a cell can only be
+# entered when nobody is in it this turn nor reserves it the next, except
+# my base which holds any number of agents. Allies without a route are
+# assumed to stay where they are when they got a command other than GO or
+# stand on gold to mine, the others most likely move in later phases.
+# Routes are kept between turns and only searched again when the agent
+# left its route, the target changed, the route got short or it collides
+# with a new wall or reservation. The distance field of the target is the
+# heuristic, so the window ends as close to the target as the
+# reservations allow. A route that starts with a wait is handed back to
+# Bot.go, whose searches treat allies as walls and find the detour a
+# short window can't see.
+class CooperativePlanner:
+    WINDOW = 8
+
+    def __init__(self, game_map, window=WINDOW):
+        self.map = game_map
+        self.window = window
+        self.n = game_map.n
+        self.ahead = game_map.topology.ahead
+        self.base = game_map.my_base[0] * game_map.n + game_map.my_base[1]
+        # turn number, times in the table are absolute
+        self.now = 0
+        # (cell, time) -> agent id
+        self.reserved = dict()
+        # agent id -> Route
+        self.routes = dict()
+        # cell -> agent id standing there this turn
+        self.occupied = dict()
+        # agents given a command from their route this turn
+        self.routed = set()
+        # agents without a route assumed to stay where they are
+        self.staying = set()
+        # states expanded by the searches of this turn
+        self.expanded = 0
+
+    def start_turn(self, agents):
+        self.now += 1
+        n = self.n
+        self.occupied = {agent.row * n + agent.col: id for id, agent in enumerate(agents)}
+        for id, route in list(self.routes.items()):
+            if id not in self.routed or id >= len(agents) or route.first != self.now:
+                self.drop(id)
+                continue
+            agent = agents[id]
+            cell, rot = route.states[0]
+            if (agent.row * n + agent.col, agent.rot.value) != (cell, rot):
+                self.drop(id)
+                continue
+            # the state of this turn is reached, occupied covers it now
+            self.reserved.pop((cell, self.now), None)
+            route.states.pop(0)
+            route.first += 1
+            if len(route.states) == 0:
+                del self.routes[id]
+        self.routed = set()
+        self.staying = set()
+        self.expanded = 0
+
+    def reserve(self, id, route):
+        for t, (cell, _) in enumerate(route.states, route.first):
+            self.reserved[(cell, t)] = id
+        self.routes[id] = route
+
+    def drop(self, id):
+        route = self.routes.pop(id, None)
+        if route is None:
+            return
+        for t, (cell, _) in enumerate(route.states, route.first):
+            if self.reserved.get((cell, t)) == id:
+                del self.reserved[(cell, t)]
+
+    # agent in cell at time t other than id, t == now is where agents
+    # stand this turn
+    def occupant(self, id, cell, t):
+        if t > self.now:
+            other = self.reserved.get((cell, t))
+            if other is not None:
+                return other if other != id else None
+        other = self.occupied.get(cell)
+        if other is None or other == id:
+            return None
+        if t == self.now or other in self.staying:
+            return other
+        return None
+
+    # can id go from cell at time t to next_cell at time t + 1
+    def free(self, id, cell, next_cell, t):
+        if next_cell == self.base:
+            return True
+        if self.reserved.get((next_cell, t + 1), id) != id:
+            return False
+        if next_cell == cell:
+            return True
+        if self.map.walls[next_cell]:
+            return False
+        if self.occupant(id, next_cell, t) is not None or self.occupant(id, next_cell, t + 1) is not None:
+            return False
+        # cells taken by moves of other planners or seen enemies
+        if t == self.now:
+            row, col = divmod(next_cell, self.n)
+            if self.map.agent_board[row][col] in (Tile.RESERVED, Tile.ENEMY):
+                return False
+        return True
+
+    # allies without a route that will most likely not leave their cell
+    def stayers(self, agents, commands):
+        board = self.map.board
+        staying = set()
+        for id, agent in enumerate(agents):
+            if id in self.routes:
+                continue
+            command = commands[id]
+            if command is None:
+                if not agent.has_gold and board[agent.row][agent.col] == Tile.GOLD:
+                    staying.add(id)
+            elif command != Command.GO:
+                staying.add(id)
+        return staying
+
+    # (cell, rotation) after every command from cell, rot, waiting included
+    def moves(self, cell, rot):
+        result = [(cell, rot)]
+        next_cell = self.ahead[cell * 4 + rot]
+        if next_cell >= 0:
+            result.append((next_cell, rot))
+        result.extend((cell, other) for other in range(4) if other != rot)
+        return result
+
+    def valid(self, id, agent, route):
+        cell = agent.row * self.n + agent.col
+        for t, (next_cell, _) in enumerate(route.states, self.now):
+            if not self.free(id, cell, next_cell, t):
+                return False
+            cell = next_cell
+        return True
+
+    # space-time A* for the next window turns, None if even waiting is
+    # impossible or target is unreachable
+    def search(self, id, agent, target, field):
+        n = self.n
+        dist = field.dist
+        start = (agent.row * n + agent.col, agent.rot.value, 0)
+        h = dist[start[0] * 4 + start[1]]
+        if h < 0:
+            return None
+        target_cell = target[0] * n + target[1]
+        parent = {start: None}
+        heap = [(h, 0, start)]
+        while heap:
+            _, _, state = heappop(heap)
+            self.expanded += 1
+            cell, rot, dt = state
+            if cell == target_cell or dt == self.window:
+                states = []
+                while state != start:
+                    states.append(state[:2])
+                    state = parent[state]
+                states.reverse()
+                # hold the target until the window ends
+                while len(states) < self.window and cell != self.base:
+                    states.append(states[-1])
+                return Route(target, self.now + 1, states)
+            t = self.now + dt
+            for next_cell, next_rot in self.moves(cell, rot):
+                next_state = (next_cell, next_rot, dt + 1)
+                if next_state in parent or not self.free(id, cell, next_cell, t):
+                    continue
+                h = dist[next_cell * 4 + next_rot]
+                if h < 0:
+                    continue
+                parent[next_state] = state
+                # deeper states first among equal estimates
+                heappush(heap, (dt + 1 + h, -dt - 1, next_state))
+        return None
+
+    # route stays in the state agent is in now
+    def waits(self, agent, route):
+        return route.states[0] == (agent.row * self.n + agent.col, agent.rot.value)
+
+    def command(self, agent, state):
+        cell, rot = state
+        n = self.n
+        if cell != agent.row * n + agent.col:
+            self.map.set_agent(cell // n, cell % n, Tile.RESERVED)
+            return Command.GO
+        return TURN_COMMANDS[(rot - agent.rot.value) % 4]
+
+    # commands for the (id, target) pairs it can plan, returns the pairs
+    # left for Bot.go: targets without a field, agents on their target
+    # and agents whose route starts with a wait. Safe routing is left to
+    # Bot.go while danger is on the map
+    def plan(self, agents, commands, pairs, safe=False):
+        game_map = self.map
+        # agents commanded by other phases left their routes
+        for id in list(self.routes):
+            if id not in self.routed and id < len(commands) and commands[id] is not None:
+                self.drop(id)
+        if safe and not game_map.heat.empty():
+            for id, _ in pairs:
+                self.drop(id)
+            return pairs
+        leftover = []
+        planned = []
+        self.staying = self.stayers(agents, commands)
+        for id, target in pairs:
+            agent = agents[id]
+            if target != game_map.my_base and game_map.board[target[0]][target[1]] != Tile.GOLD:
+                self.drop(id)
+                leftover.append((id, target))
+                continue
+            if (agent.row, agent.col) == target:
+                self.drop(id)
+                leftover.append((id, target))
+                continue
+            route = self.routes.get(id)
+            if route is not None and (route.target != target or len(route.states) < self.window // 2
+                                      or self.waits(agent, route) or not self.valid(id, agent, route)):
+                self.drop(id)
+                route = None
+            planned.append((id, target, route))
+        for id, target, route in planned:
+            agent = agents[id]
+            if route is None:
+                route = self.search(id, agent, target, game_map.field(target))
+                # waiting first usually means an ally blocks the way for
+                # longer than the window, Bot.go routes around allies
+                if route is None or self.waits(agent, route):
+                    self.drop(id)
+                    leftover.append((id, target))
+                    continue
+                self.reserve(id, route)
+            self.routed.add(id)
+            commands[id] = self.command(agent, route.states[0])
+        return leftover
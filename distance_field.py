@@ -0,0 +1,319 @@
+from heapq import heappush, heappop
+from itertools import chain
+from topology import topology
+import math
+
+
+# Reverse BFS over (cell, rotation) states towards a set of goal cells.
+# State index is (row * n + col) * 4 + rotation. Every command (GO, LEFT,
+# RIGHT, BACK) costs one turn, so dist[state] is the number of turns an
+# agent standing in that state needs to reach any goal. Allies are ignored,
+# only walls block.
+class DistanceField:
+    def __init__(self, n, sources):
+        self.n = n
+        self.sources = list(sources)
+        self.dist = None
+        self.stale = True
+        # extra cost of stepping into a cell, set by build_weighted
+        self.danger = None
+        # bumped by every build or repair, fields change in place
+        self.builds = 0
+        # (weighted, generator) of a build stopped by its deadline
+        self.partial = None
+
+    # Builds the field. With a deadline the build stops once it expires
+    # and the next call resumes it, the old distances stay in place and the
+    # field stays stale until it is done. Returns True when built.
+    def build(self, walls, deadline=None):
+        if self.partial is None or self.partial[0]:
+            self.partial = (False, self.bfs(walls))
+        return self.resume(deadline)
+
+    def build_weighted(self, walls, danger, deadline=None):
+        if self.partial is None or not self.partial[0]:
+            self.partial = (True, self.dial(walls, danger))
+        return self.resume(deadline)
+
+    def resume(self, deadline):
+        for _ in self.partial[1]:
+            if deadline is not None and deadline.expired():
+                return False
+        self.partial = None
+        return True
+
+    # plain build, yields every 1024 states so a deadline can pause it
+    def bfs(self, walls):
+        n = self.n
+        dist = [-1] * (4 * n * n)
+        queue = []
+        for row, col in self.sources:
+            cell = row * n + col
+            if walls[cell]:
+                continue
+            for state in range(cell * 4, cell * 4 + 4):
+                if dist[state] < 0:
+                    dist[state] = 0
+                    queue.append(state)
+        ahead = topology(n).ahead
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            if head & 1023 == 0:
+                yield
+            d = dist[state] + 1
+            rot = state & 3
+            # any rotation of this cell can turn into this state
+            first = state - rot
+            for other in range(first, first + 4):
+                if dist[other] < 0:
+                    dist[other] = d
+                    queue.append(other)
+            # step forward from the previous cell with the same rotation
+            prev = ahead[state ^ 2]
+            if prev < 0 or walls[prev]:
+                continue
+            prev_state = prev * 4 + rot
+            if dist[prev_state] < 0:
+                dist[prev_state] = d
+                queue.append(prev_state)
+        self.dist = dist
+        self.danger = None
+        self.stale = False
+        self.builds += 1
+
+    # Same as bfs but stepping into a cell costs 1 + danger[cell], so
+    # dist[state] is the cheapest weighted cost instead of turns. Uses a
+    # Dial bucket queue, costs are small integers so a ring of
+    # max step cost + 1 buckets replaces the heap.
+    def dial(self, walls, danger):
+        n = self.n
+        # next_tile needs the costs the field was built with
+        danger = danger[:]
+        dist = [-1] * (4 * n * n)
+        done = bytearray(4 * n * n)
+        ring = 2 + max(danger)
+        buckets = [[] for _ in range(ring)]
+        pending = 0
+        for row, col in self.sources:
+            cell = row * n + col
+            if walls[cell]:
+                continue
+            for state in range(cell * 4, cell * 4 + 4):
+                if dist[state] < 0:
+                    dist[state] = 0
+                    buckets[0].append(state)
+                    pending += 1
+        ahead = topology(n).ahead
+        d = 0
+        popped = 0
+        while pending:
+            bucket = buckets[d % ring]
+            while bucket:
+                state = bucket.pop()
+                pending -= 1
+                popped += 1
+                if popped & 1023 == 0:
+                    yield
+                if done[state] or dist[state] != d:
+                    continue
+                done[state] = 1
+                rot = state & 3
+                # any rotation of this cell can turn into this state
+                first = state - rot
+                for other in range(first, first + 4):
+                    if dist[other] < 0 or d + 1 < dist[other]:
+                        dist[other] = d + 1
+                        buckets[(d + 1) % ring].append(other)
+                        pending += 1
+                # step forward from the previous cell with the same rotation
+                prev = ahead[state ^ 2]
+                if prev < 0 or walls[prev]:
+                    continue
+                prev_state = prev * 4 + rot
+                step = d + 1 + danger[state >> 2]
+                if dist[prev_state] < 0 or step < dist[prev_state]:
+                    dist[prev_state] = step
+                    buckets[step % ring].append(prev_state)
+                    pending += 1
+            d += 1
+        self.dist = dist
+        self.danger = danger
+        self.stale = False
+        self.builds += 1
+
+    # Repairs the field after walls were added at cells instead of building
+    # it again. Returns False when a goal is walled, the field then needs a
+    # build.
+    def add_walls(self, cells, walls):
+        dist = self.dist
+        candidates = []
+        for cell in cells:
+            for state in range(cell * 4, cell * 4 + 4):
+                if dist[state] == 0:
+                    return False
+                if dist[state] > 0:
+                    heappush(candidates, (dist[state], state))
+        return self.repair(candidates, [], walls)
+
+    # Repairs a weighted field after danger changed at cells. A step into
+    # a cell that got more dangerous may no longer give the distance of the
+    # state before it, a step into a safer one may improve it. Returns
+    # False for a field built without danger.
+    def set_danger(self, cells, walls, danger):
+        if self.danger is None:
+            return False
+        dist = self.dist
+        ahead = topology(self.n).ahead
+        candidates = []
+        lowered = []
+        # cell -> danger the distances were found with
+        changed = dict()
+        for cell in cells:
+            old = self.danger[cell]
+            new = danger[cell]
+            if old == new or cell in changed:
+                continue
+            changed[cell] = old
+            self.danger[cell] = new
+            if walls[cell]:
+                continue
+            for state in range(cell * 4, cell * 4 + 4):
+                if dist[state] < 0:
+                    continue
+                prev = ahead[state ^ 2]
+                if prev < 0 or walls[prev]:
+                    continue
+                prev_state = prev * 4 + (state & 3)
+                if new < old:
+                    lowered.append(prev_state)
+                elif dist[prev_state] == dist[state] + 1 + old:
+                    heappush(candidates, (dist[prev_state], prev_state))
+        return self.repair(candidates, lowered, walls, changed)
+
+    # Walls and more danger only make distances grow: candidate states in
+    # increasing order of their old distance lose it when no neighbour still
+    # gives it. Lost states and lowered states then get new distances from
+    # the states around them, so the work is bounded by the states that
+    # changed. changed maps cells whose danger was just set to the danger
+    # the old distances were found with.
+    def repair(self, candidates, lowered, walls, changed=None):
+        n = self.n
+        dist = self.dist
+        danger = self.danger
+        ahead = topology(n).ahead
+        lost = []
+        while candidates:
+            d, state = heappop(candidates)
+            if dist[state] != d:
+                continue
+            cell = state >> 2
+            rot = state & 3
+            if not walls[cell]:
+                # still d if a rotation or the step forward keeps it
+                first = state - rot
+                if any(dist[other] == d - 1 for other in range(first, first + 4)):
+                    continue
+                next_cell = ahead[state]
+                if next_cell >= 0 and not walls[next_cell]:
+                    cost = 1 if danger is None else 1 + danger[next_cell]
+                    if d >= cost and dist[next_cell * 4 + rot] == d - cost:
+                        continue
+            dist[state] = -1
+            lost.append(state)
+            # states that got their distance through this one
+            first = state - rot
+            for other in range(first, first + 4):
+                if dist[other] == d + 1:
+                    heappush(candidates, (d + 1, other))
+            prev = ahead[state ^ 2]
+            if prev >= 0 and not walls[prev]:
+                prev_state = prev * 4 + rot
+                if danger is None:
+                    cost = 1
+                else:
+                    cost = 1 + (danger[cell] if changed is None else changed.get(cell, danger[cell]))
+                if dist[prev_state] == d + cost:
+                    heappush(candidates, (d + cost, prev_state))
+        if not lost and not lowered:
+            return True
+        queue = []
+        for state in chain(lost, lowered):
+            cell = state >> 2
+            if walls[cell]:
+                continue
+            rot = state & 3
+            best = dist[state]
+            first = state - rot
+            for other in range(first, first + 4):
+                if dist[other] >= 0 and (best < 0 or dist[other] + 1 < best):
+                    best = dist[other] + 1
+            next_cell = ahead[state]
+            if next_cell >= 0 and not walls[next_cell] and dist[next_cell * 4 + rot] >= 0:
+                step = dist[next_cell * 4 + rot] + (1 if danger is None else 1 + danger[next_cell])
+                if best < 0 or step < best:
+                    best = step
+            if best >= 0:
+                dist[state] = best
+                heappush(queue, (best, state))
+        # same relaxation as build_weighted, only repaired states can improve
+        while queue:
+            d, state = heappop(queue)
+            if dist[state] != d:
+                continue
+            rot = state & 3
+            first = state - rot
+            for other in range(first, first + 4):
+                if dist[other] < 0 or d + 1 < dist[other]:
+                    dist[other] = d + 1
+                    heappush(queue, (d + 1, other))
+            prev = ahead[state ^ 2]
+            if prev < 0 or walls[prev]:
+                continue
+            prev_state = prev * 4 + rot
+            step = d + (1 if danger is None else 1 + danger[state >> 2])
+            if dist[prev_state] < 0 or step < dist[prev_state]:
+                dist[prev_state] = step
+                heappush(queue, (step, prev_state))
+        self.builds += 1
+        return True
+
+    # returns math.inf if goal is unreachable
+    def distance(self, cords, rot=None):
+        first = (cords[0] * self.n + cords[1]) * 4
+        if rot is None:
+            values = [d for d in self.dist[first:first + 4] if d >= 0]
+            return min(values) if values else math.inf
+        d = self.dist[first + rot.value]
+        return d if d >= 0 else math.inf
+
+    # returns first tile on the best path or None, same contract as Map.bfs
+    # among equally good steps the ones not in blocked are preferred
+    def next_tile(self, cords, rot, blocked=None):
+        n = self.n
+        row, col = cords
+        cell = row * n + col
+        d = self.dist[cell * 4 + rot.value]
+        if d <= 0:
+            return None
+        ahead = topology(n).ahead
+        fallback = None
+        # prefer going forward, then rotating
+        for r in [rot.value] + [r for r in range(4) if r != rot.value]:
+            next_cell = ahead[cell * 4 + r]
+            if next_cell < 0:
+                continue
+            if r == rot.value:
+                cost = 1 if self.danger is None else 1 + self.danger[next_cell]
+                good = self.dist[next_cell * 4 + r] == d - cost
+            else:
+                good = self.dist[cell * 4 + r] == d - 1
+            if not good:
+                continue
+            next_tile = divmod(next_cell, n)
+            if blocked is None or next_tile not in blocked:
+                return next_tile
+            if fallback is None:
+                fallback = next_tile
+        return fallback
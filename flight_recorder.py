@@ -0,0 +1,247 @@
+import sys
+import json
+import random
+import signal
+import logging
+import traceback
+from array import array
+from bot import Bot
+from agent import Agent
+from utils import Tile, Rotation, Command
+from patches import Patches
+
+NO_COMMAND = 255
+NO_TARGET = -1
+
+
+# Keeps the last TURNS turns of one Bot in preallocated ring arrays: the
+# agents read, the targets the bot headed for and the commands it sent,
+# plus the random state, the remembered enemy sightings, the targets with
+# a built distance field and the published change sets of every turn.
+# Installing wraps methods of the Bot instance with Patches. dump
+# writes the ring as JSON together with the board at the start of the
+# oldest kept turn, rebuilt by undoing the change sets, so replay can run
+# the same turns through a fresh Bot.
+class FlightRecorder:
+    TURNS = 32
+    # agents per turn the arrays start with, they grow when needed
+    AGENTS = 64
+
+    # dumps go to path + "." + turn
+    def __init__(self, path, turns=TURNS):
+        self.path = path
+        self.turns = turns
+        self.bot = None
+        self.patches = Patches()
+        # turns recorded so far, the current one is count - 1
+        self.count = 0
+        self.slot = None
+        self.sizes = array("H", bytes(2 * turns))
+        self.randoms = [None] * turns
+        # cell -> age of the enemy sighting when the turn started
+        self.sightings = [None] * turns
+        # targets with a built distance field when the turn started, the
+        # assignment costs depend on them
+        self.fields = [None] * turns
+        self.changes = [[] for _ in range(turns)]
+        self.width = 0
+        self.allocate(self.AGENTS)
+
+    def allocate(self, width):
+        old = None
+        if self.width:
+            old = (self.width, self.rows, self.cols, self.rots, self.tiles, self.dists, self.gold,
+                   self.targets, self.commands)
+        size = self.turns * width
+        self.rows = array("H", bytes(2 * size))
+        self.cols = array("H", bytes(2 * size))
+        self.rots = bytearray(size)
+        self.tiles = bytearray(size)
+        self.dists = array("H", bytes(2 * size))
+        self.gold = bytearray(size)
+        self.targets = array("i", [NO_TARGET]) * size
+        self.commands = bytearray([NO_COMMAND]) * size
+        # copied into a slot when its turn starts
+        self.no_targets = array("i", [NO_TARGET]) * width
+        self.no_commands = bytes([NO_COMMAND]) * width
+        self.width = width
+        if old is None:
+            return
+        old_width, *arrays = old
+        new_arrays = [self.rows, self.cols, self.rots, self.tiles, self.dists, self.gold,
+                      self.targets, self.commands]
+        for slot in range(self.turns):
+            for new, previous in zip(new_arrays, arrays):
+                new[slot * width:slot * width + old_width] = previous[slot * old_width:(slot + 1) * old_width]
+
+    def install(self, bot):
+        self.bot = bot
+        self.patches.wrap(bot, "update", self.recorded_update)
+        self.patches.wrap(bot, "command", self.recorded_command)
+        self.patches.wrap(bot, "go", self.recorded_go)
+        self.patches.wrap(bot, "go_all", self.recorded_go_all)
+        bot.map.subscribe(self.published)
+        return self
+
+    def uninstall(self):
+        self.patches.restore()
+        self.bot.map.subscribers.remove(self.published)
+
+    # SIGUSR1 dumps the ring without stopping the game
+    def install_signal(self, signum=getattr(signal, "SIGUSR1", None)):
+        if signum is not None:
+            signal.signal(signum, lambda signum, frame: self.dump(f"signal {signum}"))
+        return self
+
+    def published(self, changes):
+        if self.slot is not None:
+            self.changes[self.slot].append(changes)
+
+    def recorded_update(self, original):
+        def update(agents):
+            slot = self.slot = self.count % self.turns
+            self.count += 1
+            self.randoms[slot] = random.getstate()
+            heat = self.bot.map.heat
+            self.sightings[slot] = {cell: heat.turn - seen for cell, seen in heat.sightings.items()}
+            self.fields[slot] = [target for target, field in self.bot.map.fields.items() if not field.stale]
+            self.changes[slot] = []
+            size = len(agents)
+            if size > self.width:
+                self.allocate(max(size, 2 * self.width))
+            self.sizes[slot] = size
+            first = slot * self.width
+            self.targets[first:first + self.width] = self.no_targets
+            self.commands[first:first + self.width] = self.no_commands
+            for i, agent in enumerate(agents, first):
+                self.rows[i] = agent.row
+                self.cols[i] = agent.col
+                self.rots[i] = agent.rot.value
+                self.tiles[i] = agent.vision.tile
+                self.dists[i] = agent.vision.dist
+                self.gold[i] = agent.has_gold
+            return original(agents)
+        return update
+
+    def recorded_command(self, original):
+        def command():
+            commands = original()
+            first = self.slot * self.width
+            for i, command in enumerate(commands, first):
+                self.commands[i] = NO_COMMAND if command is None else command.value
+            return commands
+        return command
+
+    def target(self, id, target):
+        if id is not None and id < self.width:
+            self.targets[self.slot * self.width + id] = target[0] * self.bot.n + target[1]
+
+    def recorded_go(self, original):
+        def go(agent, target, safe=False):
+            self.target(getattr(agent, "id", None), target)
+            return original(agent, target, safe)
+        return go
+
+    def recorded_go_all(self, original):
+        def go_all(agents, commands, pairs, safe=False):
+            for id, target in pairs:
+                self.target(id, target)
+            return original(agents, commands, pairs, safe)
+        return go_all
+
+    # flat board before the update of turn, undoing the change sets
+    # published since then and the ones not published yet
+    def board_before(self, turn):
+        game_map = self.bot.map
+        board = bytearray(game_map.tiles)
+        for cell, old_tile in game_map.changes.old.items():
+            board[cell] = old_tile
+        for past in range(self.count - 1, turn - 1, -1):
+            for changes in reversed(self.changes[past % self.turns]):
+                for cell, old_tile, _ in changes.tiles:
+                    board[cell] = old_tile
+        return board
+
+    def turn_record(self, turn):
+        slot = turn % self.turns
+        first = slot * self.width
+        agents = []
+        targets = []
+        commands = []
+        n = self.bot.n
+        for i in range(first, first + self.sizes[slot]):
+            agents.append(f"{self.rows[i]} {self.cols[i]} {Tile(self.tiles[i]).name} {self.dists[i]}"
+                          f" {Rotation(self.rots[i]).name} {self.gold[i]}")
+            target = self.targets[i]
+            targets.append(None if target == NO_TARGET else divmod(target, n))
+            command = self.commands[i]
+            commands.append(None if command == NO_COMMAND else Command(command).name)
+        return {
+            "turn": turn,
+            "random": self.randoms[slot],
+            "sightings": self.sightings[slot],
+            "fields": self.fields[slot],
+            "agents": agents,
+            "targets": targets,
+            "commands": commands,
+        }
+
+    # writes the ring, returns the path of the dump or None if nothing
+    # was recorded
+    def dump(self, reason=""):
+        if self.count == 0:
+            return None
+        bot = self.bot
+        first = max(0, self.count - self.turns)
+        record = {
+            "reason": reason,
+            "header": [bot.n, bot.game_length, bot.n_players, bot.my_base, bot.enemy_bases],
+            "board": self.board_before(first).hex(),
+            "turns": [self.turn_record(turn) for turn in range(first, self.count)],
+        }
+        path = f"{self.path}.{self.count - 1}"
+        with open(path, "w") as file:
+            json.dump(record, file)
+        logging.error(f"flight recorder dumped turns {first}-{self.count - 1} to {path}")
+        return path
+
+    def dump_exception(self, error):
+        return self.dump("".join(traceback.format_exception(error)))
+
+
+def read_dump(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+# runs the dumped turns through a fresh Bot that starts from the dumped
+# board, sightings and fields, yields (turn record, commands) per turn. Exceptions
+# of the bot propagate, so the crash happens again under a debugger.
+def replay_dump(record, bot_factory=Bot):
+    n, game_length, n_players, my_base, enemy_bases = record["header"]
+    bot = bot_factory(n, game_length, n_players, tuple(my_base), [tuple(base) for base in enemy_bases])
+    board = bytes.fromhex(record["board"])
+    for cell, tile in enumerate(board):
+        bot.map.set_tile(*divmod(cell, n), Tile(tile))
+    bot.map.publish()
+    heat = bot.map.heat
+    heat.sightings = {int(cell): heat.turn - age for cell, age in record["turns"][0]["sightings"].items()}
+    for target in record["turns"][0]["fields"]:
+        bot.map.field(tuple(target))
+    for turn in record["turns"]:
+        version, state, gauss = turn["random"]
+        random.setstate((version, tuple(state), gauss))
+        bot.update([Agent.from_string(line) for line in turn["agents"]])
+        commands = bot.command()
+        yield turn, [None if command is None else command.name for command in commands]
+
+
+# python flight_recorder.py dump replays it without a turn budget so the
+# result does not depend on the machine, prints turns whose commands differ
+if __name__ == "__main__":
+    Bot.TURN_BUDGET = None
+    record = read_dump(sys.argv[1])
+    print(record["reason"])
+    for turn, commands in replay_dump(record):
+        same = "same" if commands == turn["commands"] else f"differs, recorded {turn['commands']}"
+        print(f"turn {turn['turn']}: {commands} {same}")
@@ -0,0 +1,82 @@
+from assignment import hungarian
+from utils import Tile
+import math
+
+# how many nearest frontier clusters are tracked for every cell
+NEAREST = 3
+
+
+# connected groups of frontier cells, diagonal neighbours included
+def clusters(frontier):
+    groups = []
+    seen = set()
+    for cords in sorted(frontier):
+        if cords in seen:
+            continue
+        seen.add(cords)
+        group = [cords]
+        stack = [cords]
+        while stack:
+            row, col = stack.pop()
+            for drow in (-1, 0, 1):
+                for dcol in (-1, 0, 1):
+                    neighbour = (row + drow, col + dcol)
+                    if neighbour in frontier and neighbour not in seen:
+                        seen.add(neighbour)
+                        group.append(neighbour)
+                        stack.append(neighbour)
+        groups.append(group)
+    return groups
+
+
+# One BFS from every frontier cluster at once over known passable tiles.
+# Each cell keeps its NEAREST closest clusters with the neighbour leading
+# towards them, so a start cell's labels give both its exploration options
+# and the first step. Ally cells are labelled but not passed through,
+# so no route steps onto an ally. Starts are then matched to distinct
+# clusters.
+# Returns first tile for every start, None if no frontier is reachable.
+def explore_steps(game_map, starts, nearest=NEAREST):
+    groups = clusters(game_map.frontier)
+    if len(groups) == 0 or len(starts) == 0:
+        return [None] * len(starts)
+    board = game_map.board
+    allies = game_map.allies
+    # cords -> list of (cluster, dist, next tile towards cluster)
+    labels = dict()
+    queue = []
+    for cluster, cells in enumerate(groups):
+        for cords in cells:
+            queue.append((cords, cluster, 0))
+    waiting = set(starts)
+    head = 0
+    while head < len(queue) and waiting:
+        cords, cluster, dist = queue[head]
+        head += 1
+        for neighbour in game_map.adjacent_cords(cords):
+            tile = board[neighbour[0]][neighbour[1]]
+            if tile == Tile.WALL or tile == Tile.FOG:
+                continue
+            found = labels.get(neighbour)
+            if found is None:
+                found = labels[neighbour] = []
+            elif len(found) >= nearest or any(label[0] == cluster for label in found):
+                continue
+            found.append((cluster, dist + 1, cords))
+            if neighbour not in allies:
+                queue.append((neighbour, cluster, dist + 1))
+            if len(found) == nearest:
+                waiting.discard(neighbour)
+
+    matrix = [[math.inf] * len(groups) for _ in starts]
+    for row, start in enumerate(starts):
+        for cluster, dist, _ in labels.get(start, []):
+            matrix[row][cluster] = dist
+    matched = hungarian(matrix)
+    steps = []
+    for row, start in enumerate(starts):
+        found = labels.get(start, [])
+        # agents left without a cluster of their own go to the nearest one
+        chosen = [label for label in found if label[0] == matched[row]] or found[:1]
+        steps.append(chosen[0][2] if chosen else None)
+    return steps
@@ -0,0 +1,194 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from utils import Tile, Rotation, Command
+
+MAGIC = b"GRLG"
+# magic, format version, n
+FILE_HEADER = struct.Struct("<4sHH")
+# turn, number of agents
+TURN_HEADER = struct.Struct("<IH")
+# row, col, rotation, vision tile, vision dist, has gold
+AGENT = struct.Struct("<HHBBHB")
+NO_COMMAND = 255
+
+
+# masks with value in every byte of an m byte integer
+def byte_masks(m):
+    ones = int.from_bytes(b"\x01" * m, "little")
+    return ones, ones * 3, ones * 7
+
+
+# 3 bits per tile, 8 tiles in 3 bytes. The 8 tiles of every group are
+# sliced into 8 big integers so the bit shuffling is done for all groups
+# at once, bytes never carry into each other.
+def pack(tiles):
+    m = -(-len(tiles) // 8)
+    tiles = bytes(tiles) + bytes(8 * m - len(tiles))
+    ones, twos, sevens = byte_masks(m)
+    t = [int.from_bytes(tiles[k::8], "little") for k in range(8)]
+    packed = bytearray(3 * m)
+    packed[0::3] = (t[0] | t[1] << 3 | (t[2] & twos) << 6).to_bytes(m, "little")
+    packed[1::3] = ((t[2] >> 2) & ones | t[3] << 1 | t[4] << 4 | (t[5] & ones) << 7).to_bytes(m, "little")
+    packed[2::3] = ((t[5] >> 1) & twos | t[6] << 2 | t[7] << 5).to_bytes(m, "little")
+    return packed
+
+
+def unpack(packed, size):
+    m = len(packed) // 3
+    ones, twos, sevens = byte_masks(m)
+    b0, b1, b2 = (int.from_bytes(packed[k::3], "little") for k in range(3))
+    t = [
+        b0 & sevens,
+        (b0 >> 3) & sevens,
+        (b0 >> 6) & twos | (b1 & ones) << 2,
+        (b1 >> 1) & sevens,
+        (b1 >> 4) & sevens,
+        (b1 >> 7) & ones | (b2 & twos) << 1,
+        (b2 >> 2) & sevens,
+        (b2 >> 5) & sevens,
+    ]
+    tiles = bytearray(8 * m)
+    for k in range(8):
+        tiles[k::8] = t[k].to_bytes(m, "little")
+    return tiles[:size]
+
+
+# Appends one record per turn to a memory mapped file: the board packed at
+# 3 bits per tile, the agents and the issued commands. Offsets of the
+# records go to path + ".idx" as 8 byte integers, so a reader finds any
+# turn without parsing the log. The index is flushed after every turn, so
+# the log of a bot that crashed or got killed reads back up to its last
+# turn. The file grows by doubling and is cut to its real size on close,
+# a log that was never closed keeps a zero filled tail.
+class GameLogWriter:
+    CAPACITY = 1 << 20
+
+    def __init__(self, path, n):
+        self.n = n
+        self.board_size = 3 * -(-n * n // 8)
+        self.file = open(path, "w+b")
+        self.index = open(path + ".idx", "wb")
+        self.capacity = 0
+        self.map = None
+        self.grow(self.CAPACITY)
+        self.size = FILE_HEADER.size
+        FILE_HEADER.pack_into(self.map, 0, MAGIC, 1, n)
+        self.turns = 0
+
+    def grow(self, capacity):
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(capacity)
+        self.capacity = capacity
+        self.map = mmap.mmap(self.file.fileno(), capacity)
+
+    # tiles is the flat board, agents any iterable of Agent like objects,
+    # commands a Command or None for every agent
+    def write(self, tiles, agents, commands):
+        agents = list(agents)
+        record = TURN_HEADER.size + self.board_size + len(agents) * (AGENT.size + 1)
+        if self.size + record > self.capacity:
+            self.grow(max(2 * self.capacity, self.size + record))
+        offset = self.size
+        TURN_HEADER.pack_into(self.map, offset, self.turns, len(agents))
+        offset += TURN_HEADER.size
+        self.map[offset:offset + self.board_size] = pack(tiles)
+        offset += self.board_size
+        for agent in agents:
+            AGENT.pack_into(self.map, offset, agent.row, agent.col, agent.rot.value,
+                            agent.vision.tile, agent.vision.dist, agent.has_gold)
+            offset += AGENT.size
+        for command in commands:
+            self.map[offset] = NO_COMMAND if command is None else command.value
+            offset += 1
+        self.size = offset
+        self.index.write(struct.pack("<Q", offset - record))
+        self.index.flush()
+        self.turns += 1
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.size)
+        self.file.close()
+        self.index.close()
+
+
+# one logged turn, board is the flat tile bytearray
+class Snapshot:
+    def __init__(self, turn, n, board, agents, commands):
+        self.turn = turn
+        self.n = n
+        self.board = board
+        # (row, col, Rotation, vision Tile, vision dist, has gold)
+        self.agents = agents
+        self.commands = commands
+
+    def tile(self, row, col):
+        return Tile(self.board[row * self.n + col])
+
+    def render(self):
+        chars = {Tile.FOG: "?", Tile.EMPTY: ".", Tile.WALL: "#", Tile.GOLD: "$"}
+        rows = [[chars.get(Tile(tile), "?") for tile in self.board[row * self.n:(row + 1) * self.n]]
+                for row in range(self.n)]
+        for row, col, _, _, _, has_gold in self.agents:
+            rows[row][col] = "G" if has_gold else "A"
+        return "\n".join("".join(row) for row in rows)
+
+
+class GameLogReader:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game log")
+        self.board_size = 3 * -(-self.n * self.n // 8)
+        self.offsets = array("Q")
+        with open(path + ".idx", "rb") as index:
+            data = index.read()
+        # a killed writer may leave part of an offset behind
+        self.offsets.frombytes(data[:len(data) - len(data) % self.offsets.itemsize])
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, turn):
+        offset = self.offsets[turn]
+        turn, n_agents = TURN_HEADER.unpack_from(self.map, offset)
+        offset += TURN_HEADER.size
+        board = unpack(self.map[offset:offset + self.board_size], self.n * self.n)
+        offset += self.board_size
+        agents = []
+        for _ in range(n_agents):
+            row, col, rot, tile, dist, has_gold = AGENT.unpack_from(self.map, offset)
+            agents.append((row, col, Rotation(rot), Tile(tile), dist, bool(has_gold)))
+            offset += AGENT.size
+        commands = [None if code == NO_COMMAND else Command(code) for code in self.map[offset:offset + n_agents]]
+        return Snapshot(turn, self.n, board, agents, commands)
+
+    def close(self):
+        self.map.close()
+
+
+# python game_log.py log [turn...] prints the board, agents and commands
+if __name__ == "__main__":
+    reader = GameLogReader(sys.argv[1])
+    # a log that was never closed has a zero filled tail, measure records
+    offsets = reader.offsets
+    size = offsets[-1] - offsets[0] if len(offsets) > 1 else os.path.getsize(sys.argv[1])
+    print(f"{len(reader)} turns  n={reader.n}  {size / max(1, len(reader) - 1) / 1024:.2f} KiB per turn")
+    for turn in sys.argv[2:]:
+        if not -len(reader) <= int(turn) < len(reader):
+            print(f"turn {turn} is not in the log, turns are 0-{len(reader) - 1}")
+            continue
+        snapshot = reader[int(turn)]
+        print(f"turn {snapshot.turn}")
+        print(snapshot.render())
+        for agent, command in zip(snapshot.agents, snapshot.commands):
+            row, col, rot, tile, dist, has_gold = agent
+            print(f"{row} {col} {rot.name} sees {tile.name} at {dist}{' gold' if has_gold else ''}"
+                  f" -> {command.name if command else '-'}")
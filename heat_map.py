@@ -0,0 +1,86 @@
+from array import array
+
+
+# Time decayed memory of enemy sightings. An enemy seen on a cell is
+# remembered for MEMORY turns or until vision shows the cell without it.
+# Every remembered sighting puts danger on its cell and on its four lines
+# of fire up to the first wall, weighted down linearly with age. The
+# danger array is updated only where a sighting appeared, aged or left,
+# those cells are kept in changed so weighted fields can be repaired.
+class HeatMap:
+    # turns an enemy sighting is remembered
+    MEMORY = 8
+    # extra step cost on the line of fire of a fresh sighting
+    DANGER = 4
+
+    def __init__(self, n, rays):
+        self.n = n
+        self.rays = rays
+        self.turn = 0
+        # cell -> turn the enemy was last seen there
+        self.sightings = dict()
+        # cell -> (weight, cells) currently added to danger
+        self.painted = dict()
+        self.danger = array("i", [0]) * (n * n)
+        # changes whenever danger changes
+        self.version = 0
+        # cells whose danger changed in the last refresh
+        self.changed = set()
+
+    def start_turn(self):
+        self.turn += 1
+
+    def seen(self, cell):
+        self.sightings[cell] = self.turn
+
+    # cells seen without an enemy on them
+    def clear(self, cells):
+        for cell in cells:
+            self.sightings.pop(cell, None)
+
+    # decayed occupancy of a cell, 0 if no enemy was seen there recently
+    def heat(self, cell):
+        seen = self.sightings.get(cell)
+        return 0 if seen is None else self.weight(seen)
+
+    def weight(self, seen):
+        age = self.turn - seen
+        if age >= self.MEMORY:
+            return 0
+        return self.DANGER * (self.MEMORY - age) // self.MEMORY
+
+    def line_of_fire(self, cell):
+        row, col = divmod(cell, self.n)
+        cells = [cell]
+        for rot in range(4):
+            cells.extend(self.rays.ray_cells(row, col, rot))
+        return cells
+
+    def paint(self, cells, weight):
+        danger = self.danger
+        for cell in cells:
+            danger[cell] += weight
+        self.changed.update(cells)
+
+    # bring danger up to date with sightings, called once per turn
+    def refresh(self):
+        self.changed = set()
+        for cell in list(self.sightings):
+            if self.weight(self.sightings[cell]) == 0:
+                del self.sightings[cell]
+        for cell in set(self.sightings) | set(self.painted):
+            weight = self.heat(cell)
+            old_weight, cells = self.painted.get(cell, (0, None))
+            if weight == old_weight:
+                continue
+            if cells is not None:
+                self.paint(cells, -old_weight)
+                del self.painted[cell]
+            if weight > 0:
+                cells = self.line_of_fire(cell)
+                self.paint(cells, weight)
+                self.painted[cell] = (weight, cells)
+            self.version += 1
+
+    def empty(self):
+        return len(self.painted) == 0
@@ -0,0 +1,222 @@
+from collections import deque
+from heapq import heappush, heappop
+
+EAST = 0
+SOUTH = 1
+
+
+# HPA* style abstraction of the board. The map is cut into SIZE x SIZE
+# clusters, every maximal run of free cells along a cluster border gets
+# one transition in its middle (two at its ends when the run is long),
+# and the entrances of a cluster are joined by their distances inside it.
+# Costs count cells only, rotations are left to refining the first
+# segment. Changed walls mark their cluster and the borders they lie on,
+# those are rebuilt when the next query reaches them. Cells are flat
+# indices (row * n + col).
+class ClusterGraph:
+    SIZE = 16
+    # runs at least this long get a transition at both ends
+    LONG_RUN = 6
+
+    def __init__(self, n, walls, size=SIZE):
+        self.n = n
+        self.walls = walls
+        self.size = size
+        self.m = -(-n // size)
+        # border (cluster, EAST or SOUTH) -> [(cell, cell across)]
+        self.transitions = dict()
+        # entrance cell -> cells across borders
+        self.links = dict()
+        self.entrances = [set() for _ in range(self.m * self.m)]
+        # cluster -> {entrance: [(entrance, cost)]}, None until built
+        self.edges = [None] * (self.m * self.m)
+        self.dirty_borders = set()
+        for cluster in range(self.m * self.m):
+            row, col = divmod(cluster, self.m)
+            if col < self.m - 1:
+                self.dirty_borders.add((cluster, EAST))
+            if row < self.m - 1:
+                self.dirty_borders.add((cluster, SOUTH))
+        # clusters whose edges the last query built
+        self.built = 0
+
+    def cluster(self, cell):
+        row, col = divmod(cell, self.n)
+        return (row // self.size) * self.m + col // self.size
+
+    # (first row, end row, first col, end col) of cluster
+    def bounds(self, cluster):
+        row, col = divmod(cluster, self.m)
+        size = self.size
+        return row * size, min(self.n, (row + 1) * size), col * size, min(self.n, (col + 1) * size)
+
+    # subscriber of Map change sets
+    def apply(self, changes):
+        for cell in changes.walls_added:
+            self.changed(cell)
+        for cell in changes.walls_removed:
+            self.changed(cell)
+
+    def changed(self, cell):
+        row, col = divmod(cell, self.n)
+        size = self.size
+        cluster = self.cluster(cell)
+        self.edges[cluster] = None
+        if col % size == size - 1 and col < self.n - 1:
+            self.dirty_borders.add((cluster, EAST))
+        if col % size == 0 and col > 0:
+            self.dirty_borders.add((cluster - 1, EAST))
+        if row % size == size - 1 and row < self.n - 1:
+            self.dirty_borders.add((cluster, SOUTH))
+        if row % size == 0 and row > 0:
+            self.dirty_borders.add((cluster - self.m, SOUTH))
+
+    def link(self, cell, other):
+        self.links.setdefault(cell, []).append(other)
+        self.entrances[self.cluster(cell)].add(cell)
+
+    def unlink(self, cell, other):
+        links = self.links[cell]
+        links.remove(other)
+        if len(links) == 0:
+            del self.links[cell]
+            self.entrances[self.cluster(cell)].discard(cell)
+
+    def rebuild_border(self, border):
+        cluster, side = border
+        first_row, end_row, first_col, end_col = self.bounds(cluster)
+        n = self.n
+        if side == EAST:
+            other = cluster + 1
+            pairs = [(row * n + end_col - 1, row * n + end_col) for row in range(first_row, end_row)]
+        else:
+            other = cluster + self.m
+            pairs = [((end_row - 1) * n + col, end_row * n + col) for col in range(first_col, end_col)]
+        for cell, across in self.transitions.get(border, []):
+            self.unlink(cell, across)
+            self.unlink(across, cell)
+        walls = self.walls
+        transitions = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and not walls[pair[0]] and not walls[pair[1]]:
+                run.append(pair)
+                continue
+            if len(run) >= self.LONG_RUN:
+                transitions.extend((run[0], run[-1]))
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+        for cell, across in transitions:
+            self.link(cell, across)
+            self.link(across, cell)
+        self.transitions[border] = transitions
+        self.edges[cluster] = None
+        self.edges[other] = None
+
+    # rebuild borders marked by changed walls
+    def refresh(self):
+        for border in self.dirty_borders:
+            self.rebuild_border(border)
+        self.dirty_borders = set()
+        self.built = 0
+
+    # steps from source to the cells of goals reachable inside cluster
+    def local_costs(self, source, cluster, goals):
+        first_row, end_row, first_col, end_col = self.bounds(cluster)
+        n = self.n
+        walls = self.walls
+        if not any(walls[row * n + first_col:row * n + end_col].count(1) for row in range(first_row, end_row)):
+            row, col = divmod(source, n)
+            return {goal: abs(goal // n - row) + abs(goal % n - col) for goal in goals}
+        costs = dict()
+        remaining = len(goals)
+        dist = {source: 0}
+        queue = deque([source])
+        while queue and remaining:
+            cell = queue.popleft()
+            d = dist[cell]
+            if cell in goals:
+                costs[cell] = d
+                remaining -= 1
+            row, col = divmod(cell, n)
+            for next_row, next_col in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if first_row <= next_row < end_row and first_col <= next_col < end_col:
+                    next_cell = next_row * n + next_col
+                    if next_cell not in dist and not walls[next_cell]:
+                        dist[next_cell] = d + 1
+                        queue.append(next_cell)
+        return costs
+
+    def cluster_edges(self, cluster):
+        edges = self.edges[cluster]
+        if edges is None:
+            entrances = self.entrances[cluster]
+            edges = dict()
+            for entrance in entrances:
+                costs = self.local_costs(entrance, cluster, entrances)
+                edges[entrance] = [(other, cost) for other, cost in costs.items() if other != entrance]
+            self.edges[cluster] = edges
+            self.built += 1
+        return edges
+
+    # (cost, cells) of the abstract path from start to target cell, the
+    # cells are the entrances passed and target. None if unreachable or
+    # out of time, clusters built on the way are kept
+    def route(self, start, target, deadline=None):
+        self.refresh()
+        if self.walls[target]:
+            return None
+        n = self.n
+        start_cluster = self.cluster(start)
+        target_cluster = self.cluster(target)
+        goals = set(self.entrances[start_cluster])
+        if start_cluster == target_cluster:
+            goals.add(target)
+        start_costs = self.local_costs(start, start_cluster, goals)
+        if target in start_costs:
+            return start_costs[target], [target]
+        # symmetric, so these are the costs from the entrances to target
+        target_costs = self.local_costs(target, target_cluster, self.entrances[target_cluster])
+        target_row, target_col = divmod(target, n)
+        cost = dict()
+        parent = dict()
+        heap = []
+        for cell, c in start_costs.items():
+            cost[cell] = c
+            parent[cell] = None
+            heappush(heap, (c + abs(cell // n - target_row) + abs(cell % n - target_col), c, cell))
+        while heap:
+            if deadline is not None and deadline.expired():
+                return None
+            _, c, cell = heappop(heap)
+            if c > cost[cell]:
+                continue
+            if cell == target:
+                cells = []
+                while cell is not None:
+                    cells.append(cell)
+                    cell = parent[cell]
+                cells.reverse()
+                return c, cells
+            neighbours = list(self.cluster_edges(self.cluster(cell)).get(cell, []))
+            neighbours.extend((across, 1) for across in self.links.get(cell, []))
+            if cell in target_costs:
+                neighbours.append((target, target_costs[cell]))
+            for next_cell, step in neighbours:
+                next_cost = c + step
+                if next_cost < cost.get(next_cell, next_cost + 1):
+                    cost[next_cell] = next_cost
+                    parent[next_cell] = cell
+                    heappush(heap, (next_cost + abs(next_cell // n - target_row) + abs(next_cell % n - target_col),
+                                    next_cost, next_cell))
+        return None
+
+    # first cell of the abstract path other than start, None if unreachable
+    # or out of time
+    def waypoint(self, start, target, deadline=None):
+        route = self.route(start, target, deadline)
+        if route is None:
+            return None
+        cells = route[1]
+        return cells[1] if cells[0] == start and len(cells) > 1 else cells[0]
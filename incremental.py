@@ -0,0 +1,194 @@
+from topology import topology
+from heapq import heappush, heappop
+from operator import or_
+import math
+
+INF = math.inf
+
+
+# D* Lite over (cell, rotation) states towards one target cell, kept alive
+# between turns. g[state] is the number of commands from state to the
+# target. The search runs backwards from the target, so any agent heading
+# there can use it, and when walls or allies change only the states whose
+# costs depend on the changed cells are repaired. Moving starts are handled
+# with the km key offset instead of restarting the search. Walls and allies
+# block stepping into a cell, except allies on the target.
+class DStarLite:
+    def __init__(self, n, target):
+        self.n = n
+        self.target = target
+        self.target_cell = target[0] * n + target[1]
+        size = 4 * n * n
+        self.g = [INF] * size
+        self.rhs = [INF] * size
+        # state -> key it is queued with, stale heap entries are skipped
+        self.queued = dict()
+        self.heap = []
+        self.blocked = bytearray(n * n)
+        self.ahead_cells = topology(n).ahead
+        # cells whose blocked status may have changed since the last query
+        self.pending = set()
+        self.initialized = False
+        self.km = 0
+        # cords of the start of the current query
+        self.start = None
+        # states expanded by the last query
+        self.expanded = 0
+
+    # manhattan distance from the start, ignores rotations
+    def heuristic(self, state):
+        row, col = divmod(state >> 2, self.n)
+        return abs(row - self.start[0]) + abs(col - self.start[1])
+
+    def key(self, state):
+        m = min(self.g[state], self.rhs[state])
+        return (m + self.heuristic(state) + self.km, m)
+
+    def push(self, state):
+        key = self.key(state)
+        self.queued[state] = key
+        heappush(self.heap, (key, state))
+
+    def top_key(self):
+        heap = self.heap
+        while heap and self.queued.get(heap[0][1]) != heap[0][0]:
+            heappop(heap)
+        return heap[0][0] if heap else (INF, INF)
+
+    # next cell for going forward in rot, None if outside the map
+    def ahead(self, cell, rot):
+        next_cell = self.ahead_cells[cell * 4 + rot]
+        return None if next_cell < 0 else next_cell
+
+    # (state, cost) of every command from state
+    def successors(self, state):
+        cell, rot = divmod(state, 4)
+        result = [(cell * 4 + other, 1) for other in range(4) if other != rot]
+        next_cell = self.ahead(cell, rot)
+        if next_cell is not None:
+            result.append((next_cell * 4 + rot, INF if self.blocked[next_cell] else 1))
+        return result
+
+    # cheapest command from state plus the cost to go after it, same as
+    # going through successors
+    def lookahead(self, state):
+        g = self.g
+        cell, rot = divmod(state, 4)
+        first = cell * 4
+        rhs = INF
+        for other in range(first, first + 4):
+            if other != state and g[other] < rhs:
+                rhs = g[other]
+        rhs += 1
+        next_cell = self.ahead_cells[state]
+        if next_cell >= 0 and not self.blocked[next_cell]:
+            forward = g[next_cell * 4 + rot] + 1
+            if forward < rhs:
+                rhs = forward
+        return rhs
+
+    # states that reach state with one command
+    def predecessors(self, state):
+        cell, rot = divmod(state, 4)
+        result = [cell * 4 + other for other in range(4) if other != rot]
+        prev_cell = self.ahead(cell, (rot + 2) % 4)
+        if prev_cell is not None:
+            result.append(prev_cell * 4 + rot)
+        return result
+
+    def update_state(self, state):
+        if state >> 2 != self.target_cell:
+            self.rhs[state] = self.lookahead(state)
+        if self.g[state] != self.rhs[state]:
+            self.push(state)
+        else:
+            self.queued.pop(state, None)
+
+    # walls and allies are flat masks of the map
+    def sync(self, walls, allies):
+        if not self.initialized:
+            self.initialized = True
+            self.blocked = bytearray(map(or_, walls, allies))
+            self.blocked[self.target_cell] = walls[self.target_cell]
+            for state in range(self.target_cell * 4, self.target_cell * 4 + 4):
+                self.rhs[state] = 0
+                self.push(state)
+            self.pending = set()
+            return
+        for cell in self.pending:
+            blocked = 1 if walls[cell] or (allies[cell] and cell != self.target_cell) else 0
+            if blocked == self.blocked[cell]:
+                continue
+            self.blocked[cell] = blocked
+            # stepping into a cell the search has not reached costs
+            # infinity either way
+            if all(g == INF for g in self.g[cell * 4:cell * 4 + 4]):
+                continue
+            # only commands stepping into cell changed cost
+            for rot in range(4):
+                prev_cell = self.ahead(cell, (rot + 2) % 4)
+                if prev_cell is not None:
+                    self.update_state(prev_cell * 4 + rot)
+        self.pending = set()
+
+    # returns False if the deadline expired, the queue is kept so the next
+    # query continues where this one stopped
+    def compute(self, start_state, deadline=None):
+        g = self.g
+        rhs = self.rhs
+        update_state = self.update_state
+        expanded = 0
+        while self.top_key() < self.key(start_state) or rhs[start_state] != g[start_state]:
+            key, state = heappop(self.heap)
+            del self.queued[state]
+            expanded += 1
+            if deadline is not None and expanded & 255 == 0 and deadline.expired():
+                self.push(state)
+                self.expanded = expanded
+                return False
+            new_key = self.key(state)
+            if key < new_key:
+                self.push(state)
+                continue
+            if g[state] > rhs[state]:
+                g[state] = rhs[state]
+            else:
+                g[state] = INF
+                update_state(state)
+            for pred in self.predecessors(state):
+                update_state(pred)
+        self.expanded = expanded
+        return True
+
+    # turns to target from start, INF if unreachable, None if out of time
+    def distance(self, walls, allies, start, start_rot, deadline=None):
+        start_state = (start[0] * self.n + start[1]) * 4 + start_rot.value
+        if self.start is not None:
+            self.km += abs(start[0] - self.start[0]) + abs(start[1] - self.start[1])
+        self.start = start
+        self.sync(walls, allies)
+        if not self.compute(start_state, deadline):
+            return None
+        return self.g[start_state]
+
+    # returns first tile on a shortest path or None, same contract as Map.bfs
+    def first_step(self, walls, allies, start, start_rot, deadline=None):
+        if start == self.target:
+            return None
+        d = self.distance(walls, allies, start, start_rot, deadline)
+        if d is None or d == INF:
+            return None
+        state = (start[0] * self.n + start[1]) * 4 + start_rot.value
+        # at most one rotation comes before the first step forward
+        for _ in range(2):
+            cell, rot = divmod(state, 4)
+            best = None
+            for succ, cost in self.successors(state):
+                if cost + self.g[succ] == self.g[state] and (best is None or succ >> 2 != cell):
+                    best = succ
+            if best is None:
+                return None
+            if best >> 2 != cell:
+                return divmod(best >> 2, self.n)
+            state = best
+        return None
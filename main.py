@@ -1,44 +1,89 @@
+import os
+import gc
 import sys
 import logging
+import tempfile
 from enum import Enum
 from map import Map
-from utils import Rotation, Tile
+from utils import Rotation
 from bot import Bot
 from agent import Agent, Vision
-
-
-# for debug
-def print_fog(bot):
-    fogs = bot.map.find_all(Tile.FOG)
-    print(len(fogs))
-    for fog in fogs:
-        print(f"{fog[0]} {fog[1]}")
+from profiler import Profiler
+from replay import Recorder
+from protocol import Protocol
+from agent_batch import AgentBatch
+from game_log import GameLogWriter
+from flight_recorder import FlightRecorder
+from speculator import Speculator
+from topology import Topology
 
 
 if __name__ == "__main__":
-    print("Grush Crusher")
-    sys.stdout.flush()
-    N, GAME_LENGTH = map(int, input().split())
-    N_PLAYERS = int(input())
-    MY_BASE = tuple(map(int, input().split()))
-    ENEMY_BASES = [tuple(map(int, input().split())) for _ in range(N_PLAYERS-1)]
+    stdin = sys.stdin.buffer
+    # GRUSH_RECORD=path saves everything read from stdin for replay.py
+    record = os.environ.get("GRUSH_RECORD")
+    if record:
+        stdin = Recorder(stdin, record)
+    protocol = Protocol(stdin, sys.stdout.buffer)
+    protocol.write_line("Grush Crusher")
+    N, GAME_LENGTH, N_PLAYERS, MY_BASE, ENEMY_BASES = protocol.read_header()
 
+    # GRUSH_WORKERS=k runs path searches in k worker processes
+    workers = os.environ.get("GRUSH_WORKERS")
+    if workers:
+        Bot.PLANNER_WORKERS = int(workers)
+    # GRUSH_CACHE=dir keeps the static tables of every map size there, empty
+    # to always build them
+    Topology.CACHE_DIR = os.environ.get("GRUSH_CACHE", os.path.join(tempfile.gettempdir(), "grush-crusher")) or None
+    # the startup tables live for the whole game, the collector neither
+    # scans them while they are built nor in later collections
+    gc.disable()
     bot = Bot(N, GAME_LENGTH, N_PLAYERS, MY_BASE, ENEMY_BASES)
+    gc.freeze()
+    gc.enable()
+    # GRUSH_PROFILE=stderr or a file path writes per turn timings as JSON lines
+    profile = os.environ.get("GRUSH_PROFILE")
+    if profile:
+        Profiler(None if profile == "stderr" else profile).install(bot)
+    # GRUSH_LOG=path keeps a snapshot of every turn, read it with game_log.py
+    log_path = os.environ.get("GRUSH_LOG")
+    log = GameLogWriter(log_path, N) if log_path else None
+    # GRUSH_TRACE=path keeps the last turns in memory and dumps them to
+    # path.<turn> when a turn throws or on SIGUSR1, replay with flight_recorder.py
+    trace = os.environ.get("GRUSH_TRACE")
+    recorder = FlightRecorder(trace).install(bot).install_signal() if trace else None
+    # GRUSH_SPECULATE=1 plans the next turn from predicted agents while
+    # waiting for input, the hit rate is written to stderr at the end
+    speculator = Speculator().install(bot) if os.environ.get("GRUSH_SPECULATE") else None
 
+    batch = AgentBatch()
     while True:
         try:
             # take input
-            n_agents = int(input())
-            agents = []
-            for _ in range(n_agents):
-                agents.append(Agent.from_string(input()))
+            agents = protocol.read_turn(batch)
+            if speculator is not None:
+                speculator.stop()
+            if agents is None:
+                break
             bot.update(agents)
             # assign commands
             commands = bot.command()
-            for command in commands:
-                print(command.name)
-            # print fog coordinates for debug
-            # print_fog(bot)
-            sys.stdout.flush()
+            protocol.write_commands(commands)
+            if log is not None:
+                log.write(bot.map.tiles, agents, commands)
+            if speculator is not None:
+                speculator.start(commands)
         except Exception as e:
             logging.exception(e)
+            if recorder is not None:
+                recorder.dump_exception(e)
+    if log is not None:
+        log.close()
+    report = bot.scheduler.report()
+    degraded = ", ".join(f"{phase} {count}" for phase, count in report["degraded_agents"].items())
+    print(f"budget: {report['degraded_turns']} of {report['turns']} turns degraded"
+          + (f", agents per phase: {degraded}" if degraded else ""), file=sys.stderr)
+    if speculator is not None:
+        report = speculator.report()
+        print(f"speculation: {report['hits']} hits, {report['misses']} misses"
+              f" ({report['hit_rate']:.0%}), {report['saved'] * 1e3:.1f} ms of planning saved", file=sys.stderr)
@@ -1,29 +1,153 @@
 from utils import Tile
 from utils import Rotation
-import math
+from distance_field import DistanceField
+from tile_index import TileIndex
+from pathfinder import Pathfinder
+from frontier import explore_steps
+from rays import Rays
+from camp_map import CampMap
+from heat_map import HeatMap
+from changes import ChangeSet
+from incremental import DStarLite
+from hierarchy import ClusterGraph
+from topology import topology
+from itertools import chain
 import random
 import logging
-from queue import Queue
+
+# returned by Map.field_step when the step needs a pathfinder search
+NEEDS_SEARCH = "needs search"
 
 
 class Map:
+    # targets with a kept D* Lite search, least recently used are dropped
+    MAX_PATHS = 32
+    # bytes all kept searches may take, a search holds two lists of 4 n^2
+    # pointers, so large maps keep fewer
+    PATHS_MEMORY = 64 * 2 ** 20
+    # most distance fields kept per kind, fields of my base are never
+    # evicted
+    MAX_FIELDS = 32
+    # bytes the fields of one kind may take, a field holds a list of 4 n^2
+    # pointers
+    FIELDS_MEMORY = 128 * 2 ** 20
+    # from this map size on long routes go over the cluster graph, None
+    # to always search the whole map
+    CLUSTERS_MIN_N = 200
+
     def __init__(self, n, my_base, enemy_bases):
         self.n = n
         self.my_base = my_base
         self.enemy_bases = enemy_bases
-        self.board = [[Tile.FOG for _ in range(n)] for _ in range(n)]
-        self.agent_board = [[Tile.EMPTY for _ in range(n)] for _ in range(n)]
+        # static neighbour tables shared by every map of this size
+        self.topology = topology(n)
+        self.board = [[Tile.FOG] * n for _ in range(n)]
+        self.agent_board = [[Tile.EMPTY] * n for _ in range(n)]
+        # cords written to agent_board since the last reset
+        self.agent_cells = []
+        # flat wall mask shared by distance fields
+        self.walls = bytearray(n * n)
+        # flat copy of board, for slicing along rays
+        self.tiles = bytearray(n * n)
+        self.rays = Rays(n)
+        # camp scores for every tile and rotation, see camp_map()
+        self.camps = CampMap(n)
+        # recent enemy sightings and the danger of their lines of fire
+        self.heat = HeatMap(n, self.rays)
+        # target cords -> danger weighted DistanceField
+        self.safe_fields = dict()
+        # target cords -> DistanceField, kept for my base and known golds
+        self.fields = dict()
+        self.max_fields = max(2, min(Map.MAX_FIELDS, Map.FIELDS_MEMORY // (32 * n * n)))
+        # fog tiles next to known passable tiles
+        self.frontier = set()
+        self.allies = set()
+        # flat mask of allies cells, for the pathfinder
+        self.ally_mask = bytearray(n * n)
+        self.pathfinder = Pathfinder(n)
+        # target cords -> DStarLite, kept between turns
+        self.paths = dict()
+        self.max_paths = max(1, min(Map.MAX_PATHS, Map.PATHS_MEMORY // (64 * n * n)))
+        # targets searched this turn and the turn before, a search is kept
+        # only for targets asked on consecutive turns
+        self.asked = set()
+        self.asked_before = set()
+        # abstract graph for long routes on large maps
+        self.clusters = None
+        if Map.CLUSTERS_MIN_N is not None and n >= Map.CLUSTERS_MIN_N:
+            self.clusters = ClusterGraph(n, self.walls)
+        # cords of every tile type
+        self.index = TileIndex(n, Tile.FOG)
+        # board changes since the last publish
+        self.changes = ChangeSet()
+        # changes published by the last update
+        self.last_changes = ChangeSet()
+        # called with every published ChangeSet, in order
+        self.subscribers = [
+            self.index.apply,
+            self.update_frontier,
+            self.camps.apply,
+            self.invalidate_fields,
+            self.invalidate_paths,
+        ]
+        if self.clusters is not None:
+            self.subscribers.append(self.clusters.apply)
 
     @staticmethod
     def dist(cords1, cords2):
         return abs(cords1[0] - cords2[0]) + abs(cords1[1] - cords2[1])
 
+    # only cells written since the last reset are cleared
+    def reset_agent_board(self):
+        for row, col in self.agent_cells:
+            self.agent_board[row][col] = Tile.EMPTY
+        self.agent_cells = []
+
+    def set_agent(self, row, col, tile):
+        self.agent_board[row][col] = tile
+        self.agent_cells.append((row, col))
+
+    # all writes to board go through here, walls and rays are updated
+    # right away, other caches when the change set is published
+    def set_tile(self, row, col, tile):
+        old_tile = self.board[row][col]
+        if old_tile == tile:
+            return
+        self.board[row][col] = tile
+        self.tiles[row * self.n + col] = tile
+        self.changes.record(row * self.n + col, old_tile)
+        if old_tile == Tile.WALL:
+            self.remove_wall(row, col)
+        if tile == Tile.WALL:
+            self.add_wall(row, col)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    # hands board changes since the last publish to subscribers
+    def publish(self):
+        changes = self.changes.close(self.tiles)
+        self.changes = ChangeSet()
+        for callback in self.subscribers:
+            callback(changes)
+        return changes
+
+    # cords within manhattan radius of center, row by row
+    def within(self, center, radius):
+        for row in range(max(0, center[0] - radius), min(self.n, center[0] + radius + 1)):
+            width = radius - abs(row - center[0])
+            for col in range(max(0, center[1] - width), min(self.n, center[1] + width + 1)):
+                yield row, col
+
+    # remove fog from all tiles within radius of center
+    def clear_fog(self, center, radius):
+        for row, col in self.within(center, radius):
+            if self.board[row][col] == Tile.FOG:
+                self.set_tile(row, col, Tile.EMPTY)
+        self.publish()
+
     def count_on_board(self, tile_type):
-        count = 0
-        for _, tile in self.iter():
-            if tile == tile_type:
-                count += 1
-        return count
+        return self.index.count(tile_type)
         
     def line_cords(self, row, col, rot, dist=None):
         # calculate max dist
@@ -58,6 +182,17 @@ class Map:
         cords = self.line_cords(row, col, rot, dist)
         return list(zip(cords, [self.board[row][col] for row, col in cords]))
 
+    # is there fog before the first non empty tile in direction rot
+    def fog_in_sight(self, row, col, rot):
+        seen = self.tiles[self.rays.ray(row, col, rot.value)]
+        ahead = seen.lstrip(bytes([Tile.EMPTY]))
+        return len(ahead) > 0 and ahead[0] == Tile.FOG
+
+    # camp scores brought up to date with the board
+    def camp_map(self):
+        self.camps.refresh(self.tiles)
+        return self.camps
+
     def iter(self):
         for row, row_vals in enumerate(self.board):
             for col, tile in enumerate(row_vals):
@@ -65,126 +200,302 @@ class Map:
 
     # returns (None, math.inf) if cannot find
     def find_closest(self, row, col, target_tile):
-        target = None
-        dist = math.inf
-        for cords, tile in self.iter():
-            if tile != target_tile:
-                continue
-            new_dist = Map.dist((row, col), cords)
-            if new_dist < dist:
-                dist = new_dist
-                target = cords
-        return target, dist
+        return self.index.closest(row, col, target_tile)
     
     def find_all(self, target_tile):
-        result = []
-        for cords, tile in self.iter():
-            if tile == target_tile:
-                result.append(cords)
-        return result
+        return self.index.all(target_tile)
     
     # add agent's vision & set my base to EMPTY (not GOLD)
+    # returns the ChangeSet of this turn
     def update(self, agents):
+        self.asked_before, self.asked = self.asked, set()
         # remove agents from map
-        self.agent_board = [[Tile.EMPTY for _ in range(self.n)] for _ in range(self.n)]
+        self.reset_agent_board()
+        allies = set()
+        self.heat.start_turn()
         # add agents and their visions
         for agent in agents:
             # set agent on agent board
-            self.agent_board[agent.row][agent.col] = Tile.ALLY
+            self.set_agent(agent.row, agent.col, Tile.ALLY)
+            allies.add((agent.row, agent.col))
             # remove fog from agents tile
             if self.board[agent.row][agent.col] == Tile.FOG:
-                self.board[agent.row][agent.col] = Tile.EMPTY
+                self.set_tile(agent.row, agent.col, Tile.EMPTY)
             # calculate vision
-            vision_line = self.line_cords(agent.row, agent.col, agent.rot, agent.vision.dist)
-            for row, col in vision_line[:-1]:
-                self.board[row][col] = Tile.EMPTY
-            last_row, last_col = vision_line[-1]
+            ray = self.rays.ray(agent.row, agent.col, agent.rot.value, agent.vision.dist)
+            seen = self.tiles[ray]
+            cells = self.rays.cells[ray]
+            # most of the time the line before the endpoint is already known
+            # to be empty
+            if seen.count(Tile.EMPTY, 0, len(seen) - 1) < len(seen) - 1:
+                for i in range(len(seen) - 1):
+                    if seen[i] != Tile.EMPTY:
+                        self.set_tile(*divmod(cells[i], self.n), Tile.EMPTY)
+            if self.heat.sightings:
+                self.heat.clear(cells[:-1])
+            last_row, last_col = divmod(cells[-1], self.n)
             tile = agent.vision.tile
+            if tile == Tile.ENEMY:
+                self.heat.seen(cells[-1])
+            elif self.heat.sightings:
+                self.heat.clear(cells[-1:])
             if tile in [Tile.ALLY, Tile.ENEMY]:
-                self.agent_board[last_row][last_col] = tile
+                self.set_agent(last_row, last_col, tile)
             else:
-                self.board[last_row][last_col] = tile
+                self.set_tile(last_row, last_col, tile)
         # set my base to EMPTY
-        self.board[self.my_base[0]][self.my_base[1]] = Tile.EMPTY
+        self.set_tile(self.my_base[0], self.my_base[1], Tile.EMPTY)
+        # allies mask only changes where allies left or arrived
+        self.changes.left = self.allies - allies
+        self.changes.arrived = allies - self.allies
+        for row, col in self.changes.left:
+            self.ally_mask[row * self.n + col] = 0
+        for row, col in self.changes.arrived:
+            self.ally_mask[row * self.n + col] = 1
+        self.allies = allies
+        self.last_changes = self.publish()
+        self.refresh_heat()
+        return self.last_changes
+
+    # ages sightings, safe fields repair the changed danger when next used
+    def refresh_heat(self):
+        self.heat.refresh()
+        if self.heat.changed:
+            for field in self.safe_fields.values():
+                field.pending.update(self.heat.changed)
+
+    # repair built fields around new walls, forget fields of golds that
+    # are gone
+    def invalidate_fields(self, changes):
+        fields = list(chain(self.fields.values(), self.safe_fields.values()))
+        if changes.walls_added:
+            for field in fields:
+                if field.stale:
+                    # a resumed build would mix old and new walls
+                    field.partial = None
+                elif not field.add_walls(changes.walls_added, self.walls):
+                    field.stale = True
+        # should not happen, walls don't move
+        if changes.walls_removed:
+            for field in fields:
+                field.stale = True
+                field.partial = None
+        for cell in changes.golds_removed:
+            target = divmod(cell, self.n)
+            if target != self.my_base:
+                self.fields.pop(target, None)
+                self.safe_fields.pop(target, None)
+
+    # kept searches repair the cells whose walls or allies changed
+    def invalidate_paths(self, changes):
+        cells = set(changes.walls_added)
+        cells.update(changes.walls_removed)
+        for row, col in changes.arrived | changes.left:
+            cells.add(row * self.n + col)
+        if cells:
+            for paths in self.paths.values():
+                paths.pending.update(cells)
+
+    def add_wall(self, row, col):
+        cell = row * self.n + col
+        self.walls[cell] = 1
+        self.rays.add_wall(cell, self.walls)
+
+    def remove_wall(self, row, col):
+        cell = row * self.n + col
+        self.walls[cell] = 0
+        self.rays.remove_wall(cell, self.walls)
+
+    # distance field towards target, built lazily and cached
+    # None when the deadline expired before the build was done, the next
+    # call resumes it
+    def field(self, target, deadline=None):
+        field = self.fields.pop(target, None)
+        if field is None:
+            field = DistanceField(self.n, [target])
+        self.keep_field(self.fields, target, field)
+        if field.stale and not field.build(self.walls, deadline):
+            return None
+        return field
+
+    # returns first tile on path or None
+    # uses cached distance fields for my base and golds, bfs otherwise
+    # on large maps targets further than two clusters go over the cluster
+    # graph unless their field is already built
+    # after deadline only already built fields are used, even stale ones
+    def path_step(self, start, start_rot, target, deadline=None):
+        if deadline is not None and deadline.expired():
+            return Map.cached_step(self.fields.get(target), start, start_rot)
+        clustered = self.over_clusters(start, target)
+        next_step = NEEDS_SEARCH
+        if not clustered or self.has_field(target):
+            next_step = self.field_step(start, start_rot, target, deadline=deadline)
+        if next_step is NEEDS_SEARCH:
+            if clustered:
+                return self.cluster_step(start, start_rot, target, deadline)
+            return self.incremental_step(start, start_rot, target, deadline)
+        return next_step
+
+    # puts field last in fields, the least recently used field other than
+    # my base is evicted once there are more than max_fields
+    def keep_field(self, fields, target, field):
+        fields[target] = field
+        if len(fields) > self.max_fields:
+            for old in fields:
+                if old != self.my_base:
+                    del fields[old]
+                    break
+
+    # first tile from the field of target, NEEDS_SEARCH when target has no
+    # field or the step is taken by an ally, safe uses the danger weighted
+    # field while enemies are remembered. A build the deadline stopped
+    # leaves the step to the old field, like after the deadline
+    def field_step(self, start, start_rot, target, safe=False, deadline=None):
+        if target != self.my_base and self.board[target[0]][target[1]] != Tile.GOLD:
+            return NEEDS_SEARCH
+        if safe and not self.heat.empty():
+            field = self.safe_field(target, deadline)
+            if field is None:
+                return Map.cached_step(self.safe_fields.get(target), start, start_rot)
+        else:
+            field = self.field(target, deadline)
+            if field is None:
+                return Map.cached_step(self.fields.get(target), start, start_rot)
+        next_step = field.next_tile(start, start_rot, self.allies)
+        # field ignores allies, route around them with bfs
+        if next_step is not None and next_step != target and next_step in self.allies:
+            return NEEDS_SEARCH
+        return next_step
+
+    # target has a field built for the current walls
+    def has_field(self, target):
+        field = self.fields.get(target)
+        return field is not None and not field.stale
+
+    # field_step would build or repair the field of target first
+    def needs_build(self, target, safe=False):
+        if target != self.my_base and self.board[target[0]][target[1]] != Tile.GOLD:
+            return False
+        if safe and not self.heat.empty():
+            field = self.safe_fields.get(target)
+            return field is None or field.stale or field.version != self.heat.version
+        field = self.fields.get(target)
+        return field is None or field.stale
+
+    # danger weighted field towards target, repaired where danger changed
+    # since it was last used, None like field() when the deadline stopped
+    # its build
+    def safe_field(self, target, deadline=None):
+        field = self.safe_fields.pop(target, None)
+        if field is None:
+            field = DistanceField(self.n, [target])
+            field.version = None
+            # cells whose danger changed since the field was last brought
+            # up to date
+            field.pending = set()
+        self.keep_field(self.safe_fields, target, field)
+        if not field.stale and field.version != self.heat.version:
+            field.stale = not field.set_danger(field.pending, self.walls, self.heat.danger)
+        if field.stale:
+            if not field.build_weighted(self.walls, self.heat.danger, deadline):
+                return None
+            # danger that changed while the build was resumed
+            field.set_danger(field.pending, self.walls, self.heat.danger)
+        field.version = self.heat.version
+        field.pending.clear()
+        return field
+
+    # like path_step but avoids lines of fire of recently seen enemies
+    # when there is no danger it is path_step
+    def safe_step(self, start, start_rot, target, deadline=None):
+        if self.heat.empty():
+            return self.path_step(start, start_rot, target, deadline)
+        if deadline is not None and deadline.expired():
+            return Map.cached_step(self.safe_fields.get(target), start, start_rot)
+        next_step = self.field_step(start, start_rot, target, safe=True, deadline=deadline)
+        if next_step is NEEDS_SEARCH:
+            return self.incremental_step(start, start_rot, target, deadline)
+        return next_step
+
+    # first tile on path from the kept search towards target, same contract
+    # as bfs, out of time returns None and the search resumes next time.
+    # Targets not asked for on the turn before get a one-off A* instead
+    def incremental_step(self, start, start_rot, target, deadline=None):
+        self.asked.add(target)
+        paths = self.paths.pop(target, None)
+        if paths is None:
+            if target not in self.asked_before:
+                return self.pathfinder.first_step(self.walls, self.ally_mask, start, start_rot, target, deadline)
+            paths = DStarLite(self.n, target)
+        self.paths[target] = paths
+        if len(self.paths) > self.max_paths:
+            del self.paths[next(iter(self.paths))]
+        return paths.first_step(self.walls, self.ally_mask, start, start_rot, deadline)
+
+    # routes further than two clusters on large maps
+    def over_clusters(self, start, target):
+        return self.clusters is not None and Map.dist(start, target) > 2 * self.clusters.size
+
+    # first tile towards the next entrance on the abstract route to target,
+    # only this first segment is searched exactly
+    def cluster_step(self, start, start_rot, target, deadline=None):
+        waypoint = self.clusters.waypoint(start[0] * self.n + start[1], target[0] * self.n + target[1], deadline)
+        if waypoint is None:
+            return None
+        return self.pathfinder.first_step(self.walls, self.ally_mask, start, start_rot,
+                                          divmod(waypoint, self.n), deadline)
+
+    @staticmethod
+    def cached_step(field, start, start_rot):
+        if field is None or field.dist is None:
+            return None
+        return field.next_tile(start, start_rot)
+
+    # returns first tile towards a frontier cluster for every start or None
+    def explore_steps(self, starts):
+        return explore_steps(self, starts)
+
+    def is_frontier(self, cords):
+        if self.board[cords[0]][cords[1]] != Tile.FOG:
+            return False
+        for row, col in self.adjacent_cords(cords):
+            tile = self.board[row][col]
+            if tile != Tile.FOG and tile != Tile.WALL:
+                return True
+        return False
+
+    # a changed tile can only change frontier status of itself and neighbours
+    def update_frontier(self, changes):
+        affected = set()
+        for cell, _, _ in changes.tiles:
+            cords = divmod(cell, self.n)
+            affected.add(cords)
+            affected.update(self.adjacent_cords(cords))
+        for cords in affected:
+            if self.is_frontier(cords):
+                self.frontier.add(cords)
+            else:
+                self.frontier.discard(cords)
 
     def random_cords(self):
         return (random.randint(0, self.n-1), random.randint(0, self.n-1))
     
+    # up, down, left, right
     def adjacent_cords(self, cords):
-        adjacent = []
-        if cords[0] > 0:
-            adjacent.append((cords[0] - 1, cords[1]))
-        if cords[0] < self.n - 1:
-            adjacent.append((cords[0] + 1, cords[1]))
-        if cords[1] > 0:
-            adjacent.append((cords[0], cords[1] - 1))
-        if cords[1] < self.n - 1:
-            adjacent.append((cords[0], cords[1] + 1))
-        return adjacent
+        n = self.n
+        ahead = self.topology.ahead
+        first = (cords[0] * n + cords[1]) * 4
+        return [divmod(ahead[first + rot], n) for rot in (0, 2, 3, 1) if ahead[first + rot] >= 0]
 
     def adjacent(self, cords, rot):
-        row, col = cords
-        if rot == Rotation.U:
-            row -= 1
-        elif rot == Rotation.R:
-            col += 1
-        elif rot == Rotation.D:
-            row += 1
-        elif rot == Rotation.L:
-            col -= 1
-        if row >= 0 and col >= 0 and row < self.n and col < self.n:
-            return (row, col)
-        return None
+        cell = self.topology.ahead[(cords[0] * self.n + cords[1]) * 4 + rot.value]
+        return None if cell < 0 else divmod(cell, self.n)
     
     # returns first tile on path or None
     # ignore walls & allies
-    def bfs(self, start, start_rot, target):
+    # with deadline returns best partial step when time runs out
+    def bfs(self, start, start_rot, target, deadline=None):
         if start == target:
             logging.info("bfs target same as start")
             return None
-        frontier = Queue()
-        frontier.put((start, start_rot))
-        came_from = dict()
-        came_from[(start, start_rot)] = None
-
-        while not frontier.empty():
-            # get new frontier
-            current, current_rot = frontier.get()
-            if current == target:
-                break           
-            
-            # go forward
-            next_tile = self.adjacent(current, current_rot)
-            if (next_tile is not None and
-                self.board[next_tile[0]][next_tile[1]] != Tile.WALL and
-                (self.agent_board[next_tile[0]][next_tile[1]] != Tile.ALLY or next_tile == target) and
-                (next_tile, current_rot) not in came_from
-            ):
-                frontier.put((next_tile, current_rot))
-                came_from[(next_tile, current_rot)] = (current, current_rot)
-                
-            # rotate
-            for rot in Rotation:
-                if rot == current_rot:
-                    continue
-                if (current, rot) not in came_from:
-                    frontier.put((current, rot))
-                    came_from[(current, rot)] = (current, current_rot)
-                    
-        # check rotation of arrival
-        target_rot = None
-        for rot in Rotation:
-            if (target, rot) in came_from:
-                target_rot = rot
-                break
-        
-        if target_rot is None:
-            return None
-
-        current = (target, target_rot)
-        while current[0] != start:
-            if came_from[current][0] == start:
-                # return just tile
-                return current[0]
-            current = came_from[current]
-        raise Exception("Path not reconstructed")
+        return self.pathfinder.first_step(self.walls, self.ally_mask, start, start_rot, target, deadline)
@@ -0,0 +1,52 @@
+from map import Map
+from utils import Tile
+import math
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+
+# Map answering whole board queries with vectorized masks on an int8 board
+# instead of keeping a TileIndex. The int8 board is a view of the flat tile
+# copy set_tile already writes, so it costs nothing to keep in sync and
+# board[row][col] stays on lists, which are faster for single cells.
+class NumpyMap(Map):
+    def __init__(self, n, my_base, enemy_bases):
+        if not HAS_NUMPY:
+            raise ImportError("NumpyMap requires numpy")
+        super().__init__(n, my_base, enemy_bases)
+        self.grid = np.frombuffer(self.tiles, dtype=np.int8).reshape(n, n)
+        self.rows, self.cols = np.indices((n, n), dtype=np.int32)
+        self.subscribers.remove(self.index.apply)
+        self.index = None
+
+    def distances(self, row, col):
+        return np.abs(self.rows - row) + np.abs(self.cols - col)
+
+    # tiles still go through set_tile so change sets see them
+    def clear_fog(self, center, radius):
+        mask = (self.distances(center[0], center[1]) <= radius) & (self.grid == Tile.FOG)
+        for row, col in zip(*np.nonzero(mask)):
+            self.set_tile(int(row), int(col), Tile.EMPTY)
+        self.publish()
+
+    def count_on_board(self, tile_type):
+        return int(np.count_nonzero(self.grid == tile_type))
+
+    # returns (None, math.inf) if cannot find
+    def find_closest(self, row, col, target_tile):
+        mask = self.grid == target_tile
+        if not mask.any():
+            return None, math.inf
+        dist = np.where(mask, self.distances(row, col), 2 * self.n)
+        # argmin returns first in row major order, same tie break as Map
+        index = int(np.argmin(dist))
+        return divmod(index, self.n), int(dist.flat[index])
+
+    def find_all(self, target_tile):
+        rows, cols = np.nonzero(self.grid == target_tile)
+        return list(zip(rows.tolist(), cols.tolist()))
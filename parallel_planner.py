@@ -0,0 +1,70 @@
+from multiprocessing import Pool, shared_memory
+from pathfinder import Pathfinder
+from scheduler import Deadline
+import weakref
+
+# state of a pool worker, set by attach
+worker = dict()
+
+
+def attach(name, n):
+    # workers share the resource tracker of the parent, which unlinks the
+    # block only if the parent did not
+    memory = shared_memory.SharedMemory(name=name)
+    worker["memory"] = memory
+    worker["walls"] = memory.buf[:n * n]
+    worker["allies"] = memory.buf[n * n:2 * n * n]
+    worker["pathfinder"] = Pathfinder(n)
+
+
+# queries are (start, start_rot, target), seconds is the time left or None
+def search(job):
+    queries, seconds = job
+    deadline = None if seconds is None else Deadline(seconds)
+    pathfinder = worker["pathfinder"]
+    walls = worker["walls"]
+    allies = worker["allies"]
+    return [pathfinder.first_step(walls, allies, start, start_rot, target, deadline)
+            for start, start_rot, target in queries]
+
+
+def close(pool, memory):
+    pool.terminate()
+    memory.close()
+    memory.unlink()
+
+
+# Runs pathfinder searches of many agents in a warm process pool. The wall
+# and ally masks are copied into shared memory once per turn, so jobs only
+# carry the (start, rotation, target) queries and the first steps come back.
+# Results keep the order of the queries.
+class ParallelPlanner:
+    def __init__(self, n, workers):
+        self.n = n
+        self.workers = workers
+        self.memory = shared_memory.SharedMemory(create=True, size=2 * n * n)
+        self.pool = Pool(workers, initializer=attach, initargs=(self.memory.name, n))
+        self.closer = weakref.finalize(self, close, self.pool, self.memory)
+
+    # copy the masks the searches read, call after Map.update
+    def publish(self, game_map):
+        size = self.n * self.n
+        self.memory.buf[:size] = game_map.walls
+        self.memory.buf[size:2 * size] = game_map.ally_mask
+
+    # first tile or None for every query, same as Map.bfs
+    def first_steps(self, queries, deadline=None):
+        if len(queries) == 0:
+            return []
+        seconds = None
+        if deadline is not None and deadline.end is not None:
+            seconds = max(0.0, deadline.remaining())
+        chunk = -(-len(queries) // self.workers)
+        jobs = [(queries[i:i + chunk], seconds) for i in range(0, len(queries), chunk)]
+        steps = []
+        for result in self.pool.map(search, jobs):
+            steps.extend(result)
+        return steps
+
+    def close(self):
+        self.closer()
@@ -0,0 +1,22 @@
+# Methods of single objects replaced by wrappers, used by the profiler,
+# the speculator and the flight recorder to install on one Bot instance.
+# Wrappers stack: a method wrapped twice wraps the first wrapper, and
+# restore undoes them in reverse order.
+class Patches:
+    def __init__(self):
+        # (owner, name, instance attribute before wrapping or None)
+        self.originals = []
+
+    # replaces owner.name with make_wrapper(current method)
+    def wrap(self, owner, name, make_wrapper):
+        original = getattr(owner, name)
+        self.originals.append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, make_wrapper(original))
+
+    def restore(self):
+        for owner, name, previous in reversed(self.originals):
+            if previous is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, previous)
+        self.originals = []
@@ -0,0 +1,135 @@
+from topology import topology
+from heapq import heappush, heappop
+
+
+# A* over (cell, rotation) states encoded as (row * n + col) * 4 + rotation.
+# Search arrays are allocated once and reused between queries, a state
+# belongs to the current search only if its stamp equals the generation.
+class Pathfinder:
+    def __init__(self, n):
+        self.n = n
+        size = 4 * n * n
+        self.size = size
+        self.stamp = [0] * size
+        self.closed = [0] * size
+        self.cost = [0] * size
+        self.parent = [0] * size
+        self.ahead = topology(n).ahead
+        self.generation = 0
+        # states expanded by the last search
+        self.expanded = 0
+
+    # manhattan distance plus rotations needed to face every required direction
+    @staticmethod
+    def heuristic(row, col, rot, target_row, target_col):
+        drow = target_row - row
+        dcol = target_col - col
+        turns = 0
+        if drow != 0 and dcol != 0:
+            if rot == (2 if drow > 0 else 0) or rot == (1 if dcol > 0 else 3):
+                turns = 1
+            else:
+                turns = 2
+        elif drow != 0:
+            turns = 0 if rot == (2 if drow > 0 else 0) else 1
+        elif dcol != 0:
+            turns = 0 if rot == (1 if dcol > 0 else 3) else 1
+        return abs(drow) + abs(dcol) + turns
+
+    # returns (first tile on path, path length) or (None, None) if unreachable
+    # walls and allies are flat n*n masks, allies do not block the target
+    # once deadline expires returns first tile towards the closest state so far
+    # with path length None
+    def search(self, walls, allies, start, start_rot, target, deadline=None):
+        n = self.n
+        size = self.size
+        self.generation += 1
+        generation = self.generation
+        stamp = self.stamp
+        closed = self.closed
+        cost = self.cost
+        parent = self.parent
+        ahead = self.ahead
+        heuristic = Pathfinder.heuristic
+        target_row, target_col = target
+        target_cell = target_row * n + target_col
+        start_cell = start[0] * n + start[1]
+        start_state = start_cell * 4 + start_rot.value
+
+        stamp[start_state] = generation
+        cost[start_state] = 0
+        parent[start_state] = -1
+        heap = [heuristic(start[0], start[1], start_rot.value, target_row, target_col) * size + start_state]
+        goal = -1
+        expanded = 0
+        best = start_state
+        best_estimate = heap[0] // size
+        timed_out = False
+        while heap:
+            key = heappop(heap)
+            state = key % size
+            if closed[state] == generation:
+                continue
+            closed[state] = generation
+            expanded += 1
+            cell = state >> 2
+            if cell == target_cell:
+                goal = state
+                break
+            if deadline is not None:
+                # remember state closest to the target in case we run out of time
+                estimate = key // size - cost[state]
+                if estimate < best_estimate:
+                    best = state
+                    best_estimate = estimate
+                if expanded & 255 == 0 and deadline.expired():
+                    timed_out = True
+                    break
+            rot = state & 3
+            row, col = divmod(cell, n)
+            next_cost = cost[state] + 1
+            # go forward
+            next_cell = ahead[state]
+            if next_cell >= 0:
+                next_row, next_col = divmod(next_cell, n)
+                if not walls[next_cell] and (not allies[next_cell] or next_cell == target_cell):
+                    next_state = next_cell * 4 + rot
+                    if stamp[next_state] != generation or next_cost < cost[next_state]:
+                        stamp[next_state] = generation
+                        cost[next_state] = next_cost
+                        parent[next_state] = state
+                        estimate = next_cost + heuristic(next_row, next_col, rot, target_row, target_col)
+                        heappush(heap, estimate * size + next_state)
+            # rotate
+            first = cell * 4
+            for next_rot in range(4):
+                if next_rot == rot:
+                    continue
+                next_state = first + next_rot
+                if stamp[next_state] != generation or next_cost < cost[next_state]:
+                    stamp[next_state] = generation
+                    cost[next_state] = next_cost
+                    parent[next_state] = state
+                    estimate = next_cost + heuristic(row, col, next_rot, target_row, target_col)
+                    heappush(heap, estimate * size + next_state)
+        self.expanded = expanded
+
+        if timed_out:
+            return self.first_tile(start_state, best), None
+        if goal < 0:
+            return None, None
+        return self.first_tile(start_state, goal), cost[goal]
+
+    # walk back to the first state that left the start tile
+    def first_tile(self, start_state, state):
+        first_tile = None
+        while state != start_state:
+            if state >> 2 != start_state >> 2:
+                first_tile = divmod(state >> 2, self.n)
+            state = self.parent[state]
+        return first_tile
+
+    # returns first tile on path or None, same contract as Map.bfs
+    def first_step(self, walls, allies, start, start_rot, target, deadline=None):
+        first_tile, _ = self.search(walls, allies, start, start_rot, target, deadline)
+        return first_tile
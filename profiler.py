@@ -0,0 +1,168 @@
+import sys
+import json
+import time
+from patches import Patches
+
+
+# Per-turn hot path counters written as JSON lines.
+# Installing wraps methods of one Bot instance (and its Map), nothing is
+# wrapped when profiling is off, so it costs nothing unless installed.
+class Profiler:
+    PHASES = ["return_gold", "shoot", "explore", "mine", "hold_position", "go_to_camp", "go_to_gold",
+              "look_ahead", "default"]
+    SCANS = ["find_all", "find_closest", "count_on_board", "explore_steps"]
+
+    # path None writes to stderr, never to stdout which carries the protocol
+    def __init__(self, path=None):
+        self.stream = sys.stderr if path is None else open(path, "a")
+        self.turn = 0
+        self.bot = None
+        self.patches = Patches()
+        self.reset()
+
+    def reset(self):
+        self.phases = dict()
+        self.scans = dict()
+        self.searches = 0
+        self.expanded = 0
+        self.cluster_routes = 0
+        self.clusters_built = 0
+        self.field_builds = 0
+        self.safe_field_builds = 0
+        self.safe_field_repairs = 0
+        # agent start cords -> [searches, expanded]
+        self.per_agent = dict()
+
+    def install(self, bot):
+        self.bot = bot
+        game_map = bot.map
+        self.patches.wrap(bot, "command", self.timed_turn)
+        for phase in Profiler.PHASES:
+            self.patches.wrap(bot, phase, lambda original, phase=phase: self.timed_phase(phase, original))
+        for scan in Profiler.SCANS:
+            self.patches.wrap(game_map, scan, lambda original, scan=scan: self.counted_scan(scan, original))
+        self.patches.wrap(game_map.pathfinder, "search", self.counted_search)
+        self.patches.wrap(game_map, "incremental_step", self.counted_incremental)
+        if game_map.clusters is not None:
+            self.patches.wrap(game_map.clusters, "route", self.counted_route)
+        if bot.cooperative is not None:
+            self.patches.wrap(bot.cooperative, "search", self.counted_cooperative)
+        self.patches.wrap(game_map, "field", self.counted_field)
+        self.patches.wrap(game_map, "safe_field", self.counted_safe_field)
+        return self
+
+    def uninstall(self):
+        self.patches.restore()
+
+    def timed_turn(self, original):
+        def command():
+            self.reset()
+            start = time.perf_counter()
+            commands = original()
+            self.emit(time.perf_counter() - start)
+            return commands
+        return command
+
+    def timed_phase(self, phase, original):
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            result = original(*args, **kwargs)
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+            return result
+        return run
+
+    def counted_scan(self, scan, original):
+        def run(*args):
+            self.scans[scan] = self.scans.get(scan, 0) + 1
+            return original(*args)
+        return run
+
+    def count_search(self, start, expanded):
+        self.searches += 1
+        self.expanded += expanded
+        key = "{} {}".format(*start)
+        stats = self.per_agent.setdefault(key, [0, 0])
+        stats[0] += 1
+        stats[1] += expanded
+
+    def counted_search(self, original):
+        def run(walls, allies, start, *args):
+            result = original(walls, allies, start, *args)
+            self.count_search(start, original.__self__.expanded)
+            return result
+        return run
+
+    # D* Lite searches kept by Map for targets without a field
+    def counted_incremental(self, original):
+        game_map = self.bot.map
+        def run(start, start_rot, target, *args):
+            result = original(start, start_rot, target, *args)
+            # one-off targets run A*, counted by counted_search
+            paths = game_map.paths.get(target)
+            if paths is not None and start != target:
+                self.count_search(start, paths.expanded)
+            return result
+        return run
+
+    # space-time searches of the cooperative planner
+    def counted_cooperative(self, original):
+        planner = self.bot.cooperative
+        def run(id, agent, *args):
+            expanded = planner.expanded
+            result = original(id, agent, *args)
+            self.count_search((agent.row, agent.col), planner.expanded - expanded)
+            return result
+        return run
+
+    # abstract routes over the cluster graph, the exact search of the
+    # first segment is counted by the pathfinder
+    def counted_route(self, original):
+        clusters = self.bot.map.clusters
+        def run(*args):
+            result = original(*args)
+            self.cluster_routes += 1
+            self.clusters_built += clusters.built
+            return result
+        return run
+
+    def counted_field(self, original):
+        game_map = original.__self__
+        def run(target, *args):
+            field = game_map.fields.get(target)
+            if field is None or field.stale:
+                self.field_builds += 1
+            return original(target, *args)
+        return run
+
+    def counted_safe_field(self, original):
+        game_map = original.__self__
+        def run(target, *args):
+            field = game_map.safe_fields.get(target)
+            builds = None if field is None or field.stale else field.builds
+            field = original(target, *args)
+            if builds is None:
+                self.safe_field_builds += 1
+            elif field is not None and field.builds != builds:
+                self.safe_field_repairs += 1
+            return field
+        return run
+
+    def emit(self, wall_time):
+        self.turn += 1
+        record = {
+            "turn": self.turn,
+            "wall": round(wall_time, 6),
+            "phases": {phase: round(seconds, 6) for phase, seconds in self.phases.items()},
+            "searches": self.searches,
+            "expanded": self.expanded,
+            "cluster_routes": self.cluster_routes,
+            "clusters_built": self.clusters_built,
+            "field_builds": self.field_builds,
+            "safe_field_builds": self.safe_field_builds,
+            "safe_field_repairs": self.safe_field_repairs,
+            "scans": self.scans,
+            "per_agent": self.per_agent,
+            "degraded": self.bot.scheduler.turn_degraded,
+        }
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
@@ -0,0 +1,99 @@
+from utils import Tile, Rotation, Command
+from agent import Agent, Vision
+
+# byte tables so parsing never goes through enum name lookups
+TILES = {name: tile for tile in Tile for name in (tile.name.encode(), tile.name.lower().encode())}
+ROTATIONS = {name: rot for rot in Rotation for name in (rot.name.encode(), rot.name.lower().encode())}
+COMMANDS = [command.name.encode() for command in Command]
+
+
+# Game protocol over binary streams. Input is read in chunks of whatever
+# is available and split into lines here, commands of a turn are sent
+# with a single write.
+class Protocol:
+    CHUNK = 1 << 16
+
+    def __init__(self, stdin, stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.lines = []
+        self.partial = b""
+        self.eof = False
+
+    # returns False when input ended
+    def fill(self):
+        if self.eof:
+            return False
+        read = getattr(self.stdin, "read1", self.stdin.read)
+        chunk = read(Protocol.CHUNK)
+        if not chunk:
+            self.eof = True
+            if self.partial:
+                self.lines.append(self.partial)
+                self.partial = b""
+                return True
+            return False
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+        self.lines.extend(lines)
+        return True
+
+    # next count lines or None on EOF, blank lines are skipped
+    def read_lines(self, count):
+        result = []
+        while len(result) < count:
+            while not self.lines:
+                if not self.fill():
+                    return None
+            take = self.lines[:count - len(result)]
+            del self.lines[:len(take)]
+            result.extend(line for line in take if line.strip())
+        return result
+
+    def read_line(self):
+        lines = self.read_lines(1)
+        return None if lines is None else lines[0]
+
+    def write_line(self, line):
+        self.stdout.write(line.encode() + b"\n")
+        self.stdout.flush()
+
+    # returns (n, game_length, n_players, my_base, enemy_bases)
+    def read_header(self):
+        n, game_length = map(int, self.read_line().split())
+        n_players = int(self.read_line())
+        my_base = tuple(map(int, self.read_line().split()))
+        enemy_bases = [tuple(map(int, line.split())) for line in self.read_lines(n_players - 1)]
+        return n, game_length, n_players, my_base, enemy_bases
+
+    @staticmethod
+    def parse_agent(line):
+        row, col, tile, dist, rot, has_gold = line.split()
+        return Agent(
+            row=int(row),
+            col=int(col),
+            rot=ROTATIONS[rot],
+            vision=Vision(tile=TILES[tile], dist=int(dist)),
+            has_gold=has_gold == b"1",
+        )
+
+    # returns agents of the next turn or None on EOF
+    # with batch the agents are parsed straight into it and batch is returned
+    def read_turn(self, batch=None):
+        line = self.read_line()
+        if line is None:
+            return None
+        lines = self.read_lines(int(line))
+        if lines is None:
+            return None
+        if batch is None:
+            return [Protocol.parse_agent(line) for line in lines]
+        batch.resize(len(lines))
+        for id, line in enumerate(lines):
+            row, col, tile, dist, rot, has_gold = line.split()
+            batch.set(id, int(row), int(col), ROTATIONS[rot], TILES[tile], int(dist), has_gold == b"1")
+        return batch
+
+    def write_commands(self, commands):
+        self.stdout.write(b"".join(COMMANDS[command.value] + b"\n" for command in commands))
+        self.stdout.flush()
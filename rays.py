@@ -0,0 +1,55 @@
+from topology import topology
+
+
+# Rays over the flat board (cell = row * n + col). A ray from a cell in a
+# rotation is a strided slice, so vision and line of sight checks slice the
+# flat tile mirror instead of building coordinate lists. free[cell * 4 + rot]
+# is the number of tiles before the first known wall or the map edge, it is
+# updated along the affected lines when a wall appears.
+class Rays:
+    def __init__(self, n):
+        self.n = n
+        self.cells = range(n * n)
+        # flat index step for each rotation
+        self.steps = [-n, 1, n, -1]
+        # no walls known yet, every ray runs to the edge
+        self.free = topology(n).edges[:]
+
+    def edge(self, cell, rot):
+        row, col = divmod(cell, self.n)
+        return (row, self.n - col - 1, self.n - row - 1, col)[rot]
+
+    # slice of the first dist tiles in direction rot, dist None stops
+    # before the first known wall
+    def ray(self, row, col, rot, dist=None):
+        cell = row * self.n + col
+        if dist is None:
+            dist = self.free[cell * 4 + rot]
+        if dist <= 0:
+            return slice(0, 0)
+        step = self.steps[rot]
+        stop = cell + step * (dist + 1)
+        return slice(cell + step, stop if stop >= 0 else None, step)
+
+    # board cells of a ray, as a range
+    def ray_cells(self, row, col, rot, dist=None):
+        return self.cells[self.ray(row, col, rot, dist)]
+
+    # cells behind cell looking towards rot get first, first + 1, ...
+    # free tiles, up to and including the previous wall
+    def fill_behind(self, cell, rot, walls, first):
+        step = self.steps[rot]
+        behind = cell - step
+        for dist in range(self.edge(cell, (rot + 2) % 4)):
+            self.free[behind * 4 + rot] = first + dist
+            if walls[behind]:
+                break
+            behind -= step
+
+    def add_wall(self, cell, walls):
+        for rot in range(4):
+            self.fill_behind(cell, rot, walls, 0)
+
+    def remove_wall(self, cell, walls):
+        for rot in range(4):
+            self.fill_behind(cell, rot, walls, self.free[cell * 4 + rot] + 1)
@@ -0,0 +1,95 @@
+import sys
+import time
+import random
+from bot import Bot
+from agent import Agent
+
+
+# binary stdin wrapper copying everything the game sends into a transcript
+class Recorder:
+    def __init__(self, stream, path):
+        self.stream = stream
+        self.file = open(path, "wb")
+
+    def tee(self, data):
+        self.file.write(data)
+        self.file.flush()
+        return data
+
+    def read1(self, size=-1):
+        return self.tee(self.stream.read1(size))
+
+    def read(self, size=-1):
+        return self.tee(self.stream.read(size))
+
+    def readline(self, size=-1):
+        return self.tee(self.stream.readline(size))
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+# returns ((n, game_length, n_players, my_base, enemy_bases), turns)
+# where turns is a list of agent line lists, one per turn
+def parse_transcript(lines):
+    lines = iter(lines)
+    n, game_length = map(int, next(lines).split())
+    n_players = int(next(lines))
+    my_base = tuple(map(int, next(lines).split()))
+    enemy_bases = [tuple(map(int, next(lines).split())) for _ in range(n_players - 1)]
+    turns = []
+    for line in lines:
+        if not line.strip():
+            continue
+        n_agents = int(line)
+        turns.append([next(lines) for _ in range(n_agents)])
+    return (n, game_length, n_players, my_base, enemy_bases), turns
+
+
+def read_transcript(path):
+    with open(path) as file:
+        return parse_transcript(file.read().splitlines())
+
+
+# feeds recorded turns through a fresh Bot, returns (latencies, commands)
+# latency covers parsing, update and command, like one turn of main.py
+def replay(header, turns, seed=0, bot_factory=Bot):
+    random.seed(seed)
+    bot = bot_factory(*header)
+    latencies = []
+    all_commands = []
+    for lines in turns:
+        start = time.perf_counter()
+        agents = [Agent.from_string(line) for line in lines]
+        bot.update(agents)
+        commands = bot.command()
+        latencies.append(time.perf_counter() - start)
+        all_commands.append(commands)
+    return latencies, all_commands
+
+
+def percentile(values, q):
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summary(latencies):
+    return {
+        "turns": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+    }
+
+
+if __name__ == "__main__":
+    # unlimited turns so the same transcript always plans the same
+    # commands, a budget makes them depend on the machine's speed
+    Bot.TURN_BUDGET = None
+    for path in sys.argv[1:]:
+        latencies, _ = replay(*read_transcript(path))
+        stats = summary(latencies)
+        print(f"{path}: {stats['turns']} turns  p50 {stats['p50'] * 1e3:.3f} ms"
+              f"  p99 {stats['p99'] * 1e3:.3f} ms  max {stats['max'] * 1e3:.3f} ms")
@@ -0,0 +1,203 @@
+from utils import Tile, Command, DIRECTIONS
+from distance_field import DistanceField
+
+GO = Command.GO.value
+MINE = Command.MINE.value
+# rotation difference (new - old) % 4 -> command value
+TURNS = [None, Command.RIGHT.value, Command.BACK.value, Command.LEFT.value]
+# command value -> rotation change
+ROTATE = {Command.RIGHT.value: 1, Command.BACK.value: 2, Command.LEFT.value: 3}
+# policy cache marks
+UNKNOWN = 255
+STAY = 254
+
+
+# Own agents' view of the game for rollouts, same rules as the simulator
+# without enemies. The board is the Map's flat tile array and is never
+# copied, gold picked up during a rollout is kept in a frozenset of mined
+# cells that is replaced only when someone mines. Agents are one tuple of
+# packed ints ((cell * 4 + rot) * 2 + has_gold), so a clone costs a few
+# pointer copies and a step builds one new tuple.
+class RolloutState:
+    __slots__ = ("n", "tiles", "base", "agents", "mined", "score")
+
+    def __init__(self, n, tiles, base, agents, mined=frozenset(), score=0):
+        self.n = n
+        self.tiles = tiles
+        self.base = base
+        self.agents = agents
+        self.mined = mined
+        self.score = score
+
+    @staticmethod
+    def from_map(game_map, agents):
+        n = game_map.n
+        packed = tuple(((agent.row * n + agent.col) * 4 + agent.rot.value) * 2 + bool(agent.has_gold)
+                       for agent in agents)
+        base = game_map.my_base[0] * n + game_map.my_base[1]
+        return RolloutState(n, game_map.tiles, base, packed)
+
+    def clone(self):
+        return RolloutState(self.n, self.tiles, self.base, self.agents, self.mined, self.score)
+
+    def is_gold(self, cell):
+        return self.tiles[cell] == Tile.GOLD and cell not in self.mined
+
+    # commands are Command values (or None) for every agent, moves are
+    # applied in agent order
+    def step(self, commands):
+        n = self.n
+        tiles = self.tiles
+        mined = self.mined
+        score = self.score
+        occupied = {agent >> 3 for agent in self.agents}
+        agents = []
+        for agent, command in zip(self.agents, commands):
+            cell = agent >> 3
+            rot = (agent >> 1) & 3
+            gold = agent & 1
+            if command == GO:
+                drow, dcol = DIRECTIONS[rot]
+                row, col = divmod(cell, n)
+                row, col = row + drow, col + dcol
+                if 0 <= row < n and 0 <= col < n:
+                    target = row * n + col
+                    if tiles[target] != Tile.WALL and (target not in occupied or target == self.base):
+                        occupied.discard(cell)
+                        occupied.add(target)
+                        cell = target
+            elif command == MINE:
+                if not gold and tiles[cell] == Tile.GOLD and cell not in mined:
+                    mined = mined | {cell}
+                    gold = 1
+            elif command in ROTATE:
+                rot = (rot + ROTATE[command]) % 4
+            if gold and cell == self.base:
+                gold = 0
+                score += 1
+            agents.append((cell * 4 + rot) * 2 + gold)
+        return RolloutState(n, tiles, self.base, tuple(agents), mined, score)
+
+
+# Greedy rollout policy read from a distance field: GO when the cell ahead
+# is one step closer, otherwise the turn towards the best rotation. Commands
+# are cached per state since rollouts visit the same states over and over.
+class FieldPolicy:
+    def __init__(self, field):
+        self.field = field
+        # rebuilding the field replaces dist, the cache belongs to this one
+        self.dist = field.dist
+        self.n = field.n
+        self.cache = bytearray([UNKNOWN]) * (4 * field.n * field.n)
+
+    def command(self, state):
+        cached = self.cache[state]
+        if cached == UNKNOWN:
+            cached = self.cache[state] = self.compute(state)
+        return None if cached == STAY else cached
+
+    def compute(self, state):
+        dist = self.dist
+        n = self.n
+        d = dist[state]
+        if d <= 0:
+            return STAY
+        cell, rot = divmod(state, 4)
+        row, col = divmod(cell, n)
+        drow, dcol = DIRECTIONS[rot]
+        if 0 <= row + drow < n and 0 <= col + dcol < n:
+            if dist[((row + drow) * n + col + dcol) * 4 + rot] == d - 1:
+                return GO
+        for other in range(4):
+            if other != rot and dist[cell * 4 + other] == d - 1:
+                return TURNS[(other - rot) % 4]
+        return STAY
+
+
+# Picks commands for agents the heuristics left idle by trying every
+# command for one agent at a time, rolling the joint action DEPTH turns
+# forward with the field policies and keeping the best value found. Runs
+# until every idle agent was tried or the deadline expires.
+class Lookahead:
+    DEPTH = 8
+    CANDIDATES = [Command.GO, Command.LEFT, Command.RIGHT, Command.BACK, Command.MINE]
+
+    def __init__(self, game_map, depth=DEPTH):
+        self.map = game_map
+        self.depth = depth
+        self.gold_policy = None
+        self.base_policy = None
+        # states stepped in the last plan
+        self.steps = 0
+        game_map.subscribe(self.invalidate)
+
+    # gold field changes with golds or walls
+    def invalidate(self, changes):
+        if changes.golds_added or changes.golds_removed or changes.walls_added or changes.walls_removed:
+            self.gold_policy = None
+
+    def policies(self):
+        base_field = self.map.field(self.map.my_base)
+        if self.base_policy is None or self.base_policy.dist is not base_field.dist:
+            self.base_policy = FieldPolicy(base_field)
+        if self.gold_policy is None:
+            golds = [gold for gold in self.map.find_all(Tile.GOLD) if gold != self.map.my_base]
+            field = DistanceField(self.map.n, golds)
+            field.build(self.map.walls)
+            self.gold_policy = FieldPolicy(field)
+        return self.base_policy, self.gold_policy
+
+    def policy(self, state, base_policy, gold_policy):
+        commands = []
+        for agent in state.agents:
+            if agent & 1:
+                commands.append(base_policy.command(agent >> 1))
+            elif state.is_gold(agent >> 3):
+                commands.append(MINE)
+            else:
+                commands.append(gold_policy.command(agent >> 1))
+        return commands
+
+    # gold returned, then carriers by distance to base, then the rest by
+    # distance to gold
+    def value(self, state, base_policy, gold_policy):
+        value = float(state.score)
+        base_dist = base_policy.dist
+        gold_dist = gold_policy.dist
+        for agent in state.agents:
+            if agent & 1:
+                d = base_dist[agent >> 1]
+                value += 0.5 + (0.5 / (1 + d) if d >= 0 else 0)
+            else:
+                d = gold_dist[agent >> 1]
+                value += 0.25 / (1 + d) if d >= 0 else 0
+        return value
+
+    def rollout(self, root, first, base_policy, gold_policy):
+        state = root.step(first)
+        for _ in range(self.depth - 1):
+            state = state.step(self.policy(state, base_policy, gold_policy))
+        self.steps += self.depth
+        return self.value(state, base_policy, gold_policy)
+
+    # fills None commands of agents, returns commands
+    def plan(self, agents, commands, deadline=None):
+        idle = [id for id, command in enumerate(commands) if command is None]
+        if len(idle) == 0:
+            return commands
+        self.steps = 0
+        base_policy, gold_policy = self.policies()
+        root = RolloutState.from_map(self.map, agents)
+        joint = [None if command is None else command.value for command in commands]
+        best_value = self.rollout(root, joint, base_policy, gold_policy)
+        for id in idle:
+            for candidate in Lookahead.CANDIDATES:
+                if deadline is not None and deadline.expired():
+                    return commands
+                joint[id] = candidate.value
+                value = self.rollout(root, joint, base_policy, gold_policy)
+                if value > best_value:
+                    best_value = value
+                    commands[id] = candidate
+            joint[id] = None if commands[id] is None else commands[id].value
+        return commands
@@ -0,0 +1,70 @@
+import math
+import time
+
+
+# wall clock deadline, seconds=None never expires
+class Deadline:
+    def __init__(self, seconds):
+        self.end = None if seconds is None else time.perf_counter() + seconds
+
+    def remaining(self):
+        if self.end is None:
+            return math.inf
+        return self.end - time.perf_counter()
+
+    def expired(self):
+        return self.end is not None and time.perf_counter() >= self.end
+
+
+# Splits the turn budget between command phases. A phase gets its share of
+# the time still left in the turn, so time saved by fast phases rolls over
+# to the later ones. Planners check the phase deadline and fall back to
+# cheap actions once it expires, which is counted as a degradation.
+class Scheduler:
+    def __init__(self, budget, shares):
+        # seconds per turn, None for no limit
+        self.budget = budget
+        # phase name -> relative share of the turn
+        self.shares = shares
+        self.turn = Deadline(None)
+        self.deadline = Deadline(None)
+        self.phase = None
+        self.pending = []
+        self.turns = 0
+        self.degraded_turns = 0
+        # phase name -> number of agents that got a cheap action
+        self.degraded = dict()
+        self.turn_degraded = False
+
+    def start_turn(self, phases):
+        self.turns += 1
+        self.turn = Deadline(self.budget)
+        self.pending = list(phases)
+        self.turn_degraded = False
+
+    def start_phase(self, name):
+        self.phase = name
+        if name in self.pending:
+            self.pending.remove(name)
+        if self.budget is None:
+            self.deadline = Deadline(None)
+            return self.deadline
+        share = self.shares.get(name, 0)
+        total = share + sum(self.shares.get(phase, 0) for phase in self.pending)
+        remaining = max(0.0, self.turn.remaining())
+        self.deadline = Deadline(remaining if total == 0 else remaining * share / total)
+        return self.deadline
+
+    # called by planners that skipped work because the deadline expired
+    def degrade(self):
+        self.degraded[self.phase] = self.degraded.get(self.phase, 0) + 1
+        if not self.turn_degraded:
+            self.turn_degraded = True
+            self.degraded_turns += 1
+
+    def report(self):
+        return {
+            "turns": self.turns,
+            "degraded_turns": self.degraded_turns,
+            "degraded_agents": dict(self.degraded),
+        }
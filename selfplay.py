@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from bot import Bot
+from simulator import Game, InProcessPlayer
+
+
+# Bot with class constants overridden, e.g. {"MINERS": 3}
+# turn budget is off so results only depend on the seed
+def tuned_bot(params):
+    return type("TunedBot", (Bot,), {"TURN_BUDGET": None, **params})
+
+
+# one headless game, job is (n, game_length, seed, [params of every player])
+def play_game(job):
+    n, game_length, seed, params = job
+    random.seed(seed)
+    players = [InProcessPlayer(tuned_bot(player_params)) for player_params in params]
+    return Game(n, game_length, n_players=len(players), seed=seed).play(players)
+
+
+# plays candidate against baseline, swapping seats every other game
+# returns (wins, draws, losses, mean score difference) of the candidate
+def evaluate(candidate, baseline, games, n, game_length, pool):
+    jobs = []
+    for seed in range(games):
+        params = [candidate, baseline] if seed % 2 == 0 else [baseline, candidate]
+        jobs.append((n, game_length, seed, params))
+    wins = draws = losses = 0
+    diff = 0
+    for seed, scores in enumerate(pool.map(play_game, jobs, chunksize=max(1, games // 64))):
+        mine, theirs = (scores[0], scores[1]) if seed % 2 == 0 else (scores[1], scores[0])
+        diff += mine - theirs
+        if mine > theirs:
+            wins += 1
+        elif mine == theirs:
+            draws += 1
+        else:
+            losses += 1
+    return wins, draws, losses, diff / max(1, games)
+
+
+# grid of {name: value} over every combination of values
+def grid(values):
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def sweep(values, games, n, game_length, workers):
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for candidate in grid(values):
+            results.append((candidate, evaluate(candidate, dict(), games, n, game_length, pool)))
+    elapsed = time.perf_counter() - start
+    total = games * len(results)
+    return results, total / elapsed / min(workers, os.cpu_count())
+
+
+def parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep Bot constants in local self-play")
+    parser.add_argument("params", nargs="+", help="NAME=v1,v2,... e.g. MINERS=3,5,8")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--n", type=int, default=24)
+    parser.add_argument("--length", type=int, default=200)
+    args = parser.parse_args()
+    values = dict()
+    for param in args.params:
+        name, options = param.split("=")
+        values[name] = [parse_value(option) for option in options.split(",")]
+    results, per_core = sweep(values, args.games, args.n, args.length, args.workers)
+    for candidate, (wins, draws, losses, diff) in results:
+        print(f"{candidate}: {wins} W {draws} D {losses} L, mean score diff {diff:+.2f}")
+    print(f"{per_core:.2f} games/s per core")
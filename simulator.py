@@ -0,0 +1,211 @@
+import sys
+import random
+import subprocess
+from utils import Tile, Rotation, Command, DIRECTIONS
+from agent import Agent
+
+
+# Local stand-in for the game server, speaking the same protocol as main.py.
+# Rules: the map is walled at the border, agents spawn at their base every
+# SPAWN_PERIOD turns, GO moves forward unless a wall or another agent is in
+# the way, MINE picks up the gold tile the agent stands on, reaching own base
+# with gold scores a point and FIRE kills the first agent in the line of
+# sight (agents carrying gold cannot fire, killed carriers drop the gold).
+class Game:
+    SPAWN_PERIOD = 3
+    MAX_AGENTS = 10
+    WALLS = 0.15
+    GOLD = 0.03
+
+    def __init__(self, n, game_length, n_players=2, seed=0):
+        self.n = n
+        self.game_length = game_length
+        self.n_players = n_players
+        self.rng = random.Random(seed)
+        self.turn = 0
+        corners = [(2, 2), (n - 3, n - 3), (2, n - 3), (n - 3, 2)]
+        self.bases = corners[:n_players]
+        self.board = [[Tile.EMPTY for _ in range(n)] for _ in range(n)]
+        for row in range(n):
+            for col in range(n):
+                if row in (0, n - 1) or col in (0, n - 1) or self.rng.random() < Game.WALLS:
+                    self.board[row][col] = Tile.WALL
+                elif self.rng.random() < Game.GOLD:
+                    self.board[row][col] = Tile.GOLD
+        # keep bases and their surroundings open
+        for base_row, base_col in self.bases:
+            for row in range(base_row - 1, base_row + 2):
+                for col in range(base_col - 1, base_col + 2):
+                    self.board[row][col] = Tile.EMPTY
+        # agent is [row, col, rotation value, has_gold]
+        self.agents = [[] for _ in range(n_players)]
+        self.scores = [0] * n_players
+
+    # header lines sent to player before the first turn
+    def header(self, player):
+        base = self.bases[player]
+        lines = [f"{self.n} {self.game_length}", f"{self.n_players}", f"{base[0]} {base[1]}"]
+        for other, (row, col) in enumerate(self.bases):
+            if other != player:
+                lines.append(f"{row} {col}")
+        return lines
+
+    def occupant(self, row, col):
+        for player, agents in enumerate(self.agents):
+            for agent in agents:
+                if agent[0] == row and agent[1] == col:
+                    return player, agent
+        return None, None
+
+    def vision(self, player, agent):
+        drow, dcol = DIRECTIONS[agent[2]]
+        row, col = agent[0], agent[1]
+        dist = 0
+        while True:
+            row, col, dist = row + drow, col + dcol, dist + 1
+            owner, _ = self.occupant(row, col)
+            if owner is not None:
+                return (Tile.ALLY if owner == player else Tile.ENEMY), dist, (row, col)
+            if self.board[row][col] != Tile.EMPTY:
+                return self.board[row][col], dist, (row, col)
+
+    # agent lines of one player for this turn
+    def agent_lines(self, player):
+        lines = []
+        for agent in self.agents[player]:
+            tile, dist, _ = self.vision(player, agent)
+            lines.append(f"{agent[0]} {agent[1]} {tile.name} {dist} {Rotation(agent[2]).name} {int(agent[3])}")
+        return lines
+
+    def spawn(self):
+        if self.turn % Game.SPAWN_PERIOD != 0:
+            return
+        for player, agents in enumerate(self.agents):
+            if len(agents) < Game.MAX_AGENTS:
+                row, col = self.bases[player]
+                agents.append([row, col, self.rng.randrange(4), False])
+
+    # commands[player] is a list of Command, one per agent
+    def step(self, commands):
+        killed = []
+        moves = []
+        for player, agents in enumerate(self.agents):
+            for agent, command in zip(agents, commands[player]):
+                if command == Command.FIRE and not agent[3]:
+                    tile, _, cords = self.vision(player, agent)
+                    if tile in (Tile.ALLY, Tile.ENEMY):
+                        killed.append(cords)
+                elif command == Command.MINE:
+                    if not agent[3] and self.board[agent[0]][agent[1]] == Tile.GOLD:
+                        self.board[agent[0]][agent[1]] = Tile.EMPTY
+                        agent[3] = True
+                elif command == Command.LEFT:
+                    agent[2] = (agent[2] + 3) % 4
+                elif command == Command.RIGHT:
+                    agent[2] = (agent[2] + 1) % 4
+                elif command == Command.BACK:
+                    agent[2] = (agent[2] + 2) % 4
+                elif command == Command.GO:
+                    moves.append((player, agent))
+        # shots resolve before movement
+        for row, col in killed:
+            player, agent = self.occupant(row, col)
+            if agent is None:
+                continue
+            if agent[3]:
+                self.board[row][col] = Tile.GOLD
+            self.agents[player].remove(agent)
+        self.rng.shuffle(moves)
+        for player, agent in moves:
+            if agent not in self.agents[player]:
+                continue
+            drow, dcol = DIRECTIONS[agent[2]]
+            row, col = agent[0] + drow, agent[1] + dcol
+            if self.board[row][col] == Tile.WALL:
+                continue
+            if (row, col) not in self.bases and self.occupant(row, col)[1] is not None:
+                continue
+            agent[0], agent[1] = row, col
+        for player, agents in enumerate(self.agents):
+            for agent in agents:
+                if agent[3] and (agent[0], agent[1]) == self.bases[player]:
+                    agent[3] = False
+                    self.scores[player] += 1
+        self.turn += 1
+
+    # plays the whole game, players[i] gets header once then agent lines
+    # every turn and returns commands, returns final scores
+    def play(self, players):
+        for player, bot in enumerate(players):
+            bot.start(self.header(player))
+        while self.turn < self.game_length:
+            self.spawn()
+            commands = [bot.turn(self.agent_lines(player)) for player, bot in enumerate(players)]
+            self.step(commands)
+        for bot in players:
+            bot.stop()
+        return self.scores
+
+
+# runs a Bot in this process, parsing the same lines main.py reads
+class InProcessPlayer:
+    def __init__(self, bot_factory, record=None):
+        self.bot_factory = bot_factory
+        self.bot = None
+        # transcript lines, same format as replay.py reads
+        self.record = record
+
+    def start(self, header):
+        if self.record is not None:
+            self.record.extend(header)
+        n, game_length = map(int, header[0].split())
+        n_players = int(header[1])
+        my_base = tuple(map(int, header[2].split()))
+        enemy_bases = [tuple(map(int, line.split())) for line in header[3:]]
+        self.bot = self.bot_factory(n, game_length, n_players, my_base, enemy_bases)
+
+    def turn(self, lines):
+        if self.record is not None:
+            self.record.append(str(len(lines)))
+            self.record.extend(lines)
+        self.bot.update([Agent.from_string(line) for line in lines])
+        return self.bot.command()
+
+    def stop(self):
+        pass
+
+
+# runs a bot as a subprocess, e.g. [sys.executable, "main.py"]
+class ProcessPlayer:
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+
+    def send(self, lines):
+        self.process.stdin.write("".join(line + "\n" for line in lines))
+        self.process.stdin.flush()
+
+    def start(self, header):
+        self.process = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        # greeting
+        self.process.stdout.readline()
+        self.send(header)
+
+    def turn(self, lines):
+        self.send([str(len(lines))] + lines)
+        return [Command[self.process.stdout.readline().strip()] for _ in lines]
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+if __name__ == "__main__":
+    # python simulator.py [n] [game length] [seed], plays main.py against itself
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    game_length = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    players = [ProcessPlayer([sys.executable, "main.py"]) for _ in range(2)]
+    print(Game(n, game_length, seed=seed).play(players))
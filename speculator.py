@@ -0,0 +1,182 @@
+import time
+import threading
+from map import NEEDS_SEARCH
+from rollout import RolloutState
+from scheduler import Deadline
+from utils import Rotation
+from patches import Patches
+
+
+# first step planned for a predicted agent
+class Plan:
+    __slots__ = ("start", "rot", "target", "safe", "step", "field", "builds", "version", "seconds")
+
+    def __init__(self, start, rot, target, safe, step, field, version, seconds):
+        self.start = start
+        self.rot = rot
+        self.target = target
+        self.safe = safe
+        self.step = step
+        # field the step was read from, None when it came from a search
+        self.field = field
+        # builds of field when the step was read
+        self.builds = None if field is None else field.builds
+        # heat map version the plan saw
+        self.version = version
+        self.seconds = seconds
+
+
+# Plans the next turn while main.py waits for input. After the commands
+# of a turn are sent every agent's next state is predicted with the
+# rollout rules, and a worker thread computes the first step towards the
+# target the agent had this turn, warming kept searches on the way. Fields
+# are only read: a build can't be interrupted when the next turn arrives,
+# so agents whose field needs one are left to the real turn. Installing
+# wraps Bot.go: when the real turn asks for the planned (start, rotation,
+# target) and the plan is still valid the step is used as is. A step read
+# from a field stays valid while the field is neither stale nor rebuilt
+# since and no ally stands on the step, a searched step only when no
+# walls changed and allies are exactly where they were predicted.
+class Speculator:
+    def __init__(self):
+        self.bot = None
+        self.patches = Patches()
+        self.thread = None
+        self.deadline = Deadline(None)
+        # agent id -> Plan of the coming turn
+        self.plans = dict()
+        # agent id -> (target, safe) of go calls this turn
+        self.targets = dict()
+        self.allies = None
+        self.planned = 0
+        self.hits = 0
+        self.misses = 0
+        # worker seconds spent on plans that were used
+        self.saved = 0.0
+
+    def install(self, bot):
+        self.bot = bot
+        self.patches.wrap(bot, "go", self.speculated_go)
+        return self
+
+    def uninstall(self):
+        self.stop()
+        self.patches.restore()
+
+    def speculated_go(self, original):
+        def go(agent, target, safe=False):
+            id = getattr(agent, "id", None)
+            self.targets[id] = (target, safe)
+            plan = self.plans.pop(id, None)
+            if plan is not None and plan.target == target and plan.safe == safe:
+                if plan.start == (agent.row, agent.col) and plan.rot == agent.rot and self.valid(plan):
+                    self.hits += 1
+                    self.saved += plan.seconds
+                    return self.bot.move(agent, plan.step)
+                self.misses += 1
+            return original(agent, target, safe)
+        return go
+
+    def valid(self, plan):
+        game_map = self.bot.map
+        if plan.safe and plan.version != game_map.heat.version:
+            return False
+        if plan.field is not None:
+            fields = game_map.safe_fields if plan.safe and not game_map.heat.empty() else game_map.fields
+            return (fields.get(plan.target) is plan.field and not plan.field.stale
+                    and plan.field.builds == plan.builds
+                    and (plan.step is None or plan.step == plan.target or plan.step not in game_map.allies))
+        changes = game_map.last_changes
+        return not changes.walls_added and not changes.walls_removed and game_map.allies == self.allies
+
+    # call right after the commands of a turn are sent
+    def start(self, commands):
+        self.stop()
+        bot = self.bot
+        game_map = bot.map
+        state = RolloutState.from_map(game_map, bot.agents)
+        predicted = state.step([None if command is None else command.value for command in commands]).agents
+        n = game_map.n
+        jobs = []
+        for id, packed in enumerate(predicted):
+            if id not in self.targets:
+                continue
+            cell, rot = divmod(packed >> 1, 4)
+            target, safe = self.targets[id]
+            jobs.append((id, divmod(cell, n), Rotation(rot), target, safe))
+        self.allies = {divmod(packed >> 3, n) for packed in predicted}
+        self.targets = dict()
+        self.plans = dict()
+        self.deadline = Deadline(None)
+        self.thread = threading.Thread(target=self.run, args=(jobs, self.deadline), daemon=True)
+        self.thread.start()
+
+    # call when the input of the next turn arrived, before Bot.update
+    def stop(self):
+        if self.thread is None:
+            return
+        # expire the deadline so a running search returns soon
+        self.deadline.end = 0.0
+        self.thread.join()
+        self.thread = None
+
+    def run(self, jobs, deadline):
+        game_map = self.bot.map
+        n = game_map.n
+        # predicted allies block like real ones while planning, kept
+        # searches resync the cells that differ now and after restoring
+        ally_mask = game_map.ally_mask
+        game_map.ally_mask = bytearray(len(ally_mask))
+        for row, col in self.allies:
+            game_map.ally_mask[row * n + col] = 1
+        allies, game_map.allies = game_map.allies, self.allies
+        moved = {row * n + col for row, col in allies ^ self.allies}
+        for paths in game_map.paths.values():
+            paths.pending.update(moved)
+        try:
+            for id, start, rot, target, safe in jobs:
+                began = time.perf_counter()
+                plan = self.plan(start, rot, target, safe, deadline)
+                if deadline.expired():
+                    return
+                if plan is None:
+                    continue
+                plan.seconds = time.perf_counter() - began
+                self.plans[id] = plan
+                self.planned += 1
+        finally:
+            game_map.ally_mask = ally_mask
+            game_map.allies = allies
+            for paths in game_map.paths.values():
+                paths.pending.update(moved)
+
+    # None when the field of target would have to be built first
+    def plan(self, start, rot, target, safe, deadline):
+        game_map = self.bot.map
+        field = None
+        if start == target:
+            step = None
+        else:
+            clustered = ((not safe or game_map.heat.empty()) and game_map.over_clusters(start, target)
+                         and not game_map.has_field(target))
+            if not clustered and game_map.needs_build(target, safe):
+                return None
+            step = NEEDS_SEARCH if clustered else game_map.field_step(start, rot, target, safe)
+            if step is NEEDS_SEARCH:
+                path_step = game_map.safe_step if safe else game_map.path_step
+                step = path_step(start, rot, target, deadline)
+            elif safe and not game_map.heat.empty():
+                field = game_map.safe_fields.get(target)
+            else:
+                field = game_map.fields.get(target)
+        return Plan(start, rot, target, safe, step, field, game_map.heat.version, 0.0)
+
+    def report(self):
+        asked = self.hits + self.misses
+        return {
+            "planned": self.planned,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / asked if asked else 0.0,
+            "saved": self.saved,
+        }
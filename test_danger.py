@@ -0,0 +1,29 @@
+import random
+import pytest
+from map import Map
+from distance_field import DistanceField
+from benchmark import random_board
+
+
+# safe fields repaired turn after turn of sightings and decay must equal
+# a fresh build
+@pytest.mark.parametrize("n", [8, 16, 32])
+@pytest.mark.parametrize("seed", range(5))
+def test_repaired_equals_fresh(n, seed):
+    rng = random.Random(seed)
+    game_map = Map(n, (n // 2, n // 2), [])
+    random_board(game_map, seed=seed, fog=0.0)
+    free = [cell for cell in range(n * n) if not game_map.walls[cell]]
+    targets = [divmod(cell, n) for cell in rng.sample(free, 3)]
+    for _ in range(20):
+        game_map.heat.start_turn()
+        for _ in range(rng.randrange(3)):
+            game_map.heat.seen(rng.choice(free))
+        if game_map.heat.sightings and rng.random() < 0.3:
+            game_map.heat.clear([rng.choice(list(game_map.heat.sightings))])
+        game_map.refresh_heat()
+        for target in rng.sample(targets, 2):
+            field = game_map.safe_field(target)
+            fresh = DistanceField(n, [target])
+            fresh.build_weighted(game_map.walls, game_map.heat.danger)
+            assert field.dist == fresh.dist, target
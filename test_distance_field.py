@@ -0,0 +1,58 @@
+import random
+import pytest
+from map import Map
+from distance_field import DistanceField
+from scheduler import Deadline
+from benchmark import random_board
+
+
+# a build paused by its deadline every time resumes to the same field as
+# one uninterrupted build
+@pytest.mark.parametrize("weighted", [False, True])
+def test_resumed_build_equals_full(weighted):
+    n = 32
+    game_map = random_board(Map(n, (0, 0), []), fog=0.0)
+    danger = bytearray(random.Random(0).randrange(3) for _ in range(n * n))
+    full = DistanceField(n, [(0, 0)])
+    paused = DistanceField(n, [(0, 0)])
+    if weighted:
+        full.build_weighted(game_map.walls, danger)
+        build = lambda deadline: paused.build_weighted(game_map.walls, danger, deadline)
+    else:
+        full.build(game_map.walls)
+        build = lambda deadline: paused.build(game_map.walls, deadline)
+    resumed = 0
+    while not build(Deadline(0)):
+        resumed += 1
+        assert paused.stale
+    assert resumed > 0
+    assert paused.dist == full.dist
+
+
+# new walls repaired into a built field must equal a fresh build
+@pytest.mark.parametrize("seed", range(5))
+def test_add_walls_equals_fresh(seed):
+    n = 16
+    rng = random.Random(seed)
+    game_map = random_board(Map(n, (0, 0), []), seed=seed, fog=0.0, gold=0.0)
+    field = DistanceField(n, [(0, 0)])
+    field.build(game_map.walls)
+    for _ in range(10):
+        cells = [cell for cell in rng.sample(range(1, n * n), 3) if not game_map.walls[cell]]
+        for cell in cells:
+            game_map.walls[cell] = 1
+        assert field.add_walls(cells, game_map.walls)
+        fresh = DistanceField(n, [(0, 0)])
+        fresh.build(game_map.walls)
+        assert field.dist == fresh.dist
+
+
+# least recently used fields are dropped first, my base is always kept
+def test_fields_evicted():
+    n = 16
+    game_map = random_board(Map(n, (0, 0), []), fog=0.0, gold=0.0)
+    game_map.max_fields = 2
+    game_map.field((0, 0))
+    for target in [(3, 3), (5, 5), (7, 7)]:
+        game_map.field(target)
+    assert list(game_map.fields) == [(0, 0), (7, 7)]
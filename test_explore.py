@@ -0,0 +1,31 @@
+import math
+import random
+import pytest
+from map import Map
+from distance_field import DistanceField
+from utils import Tile
+
+
+# exploring agents never step onto an ally, and find a step whenever a
+# route around allies exists
+@pytest.mark.parametrize("n", [8, 16, 32])
+@pytest.mark.parametrize("seed", range(5))
+def test_no_step_onto_ally(n, seed):
+    rng = random.Random(seed)
+    game_map = Map(n, (n // 2, n // 2), [])
+    for _ in range(3):
+        game_map.clear_fog(game_map.random_cords(), n // 4)
+    known = game_map.find_all(Tile.EMPTY)
+    starts = rng.sample(known, min(10, len(known)))
+    game_map.allies = set(starts)
+    steps = game_map.explore_steps(starts)
+    fog = DistanceField(n, game_map.find_all(Tile.FOG))
+    for start, step in zip(starts, steps):
+        assert step is None or step not in game_map.allies, (start, step)
+        # the route to the frontier may only pass known tiles that are not
+        # allies
+        walls = bytearray(game_map.walls)
+        for row, col in game_map.allies - {start}:
+            walls[row * n + col] = 1
+        fog.build(walls)
+        assert (step is None) == (fog.distance(start) == math.inf), (start, step)
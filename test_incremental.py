@@ -0,0 +1,65 @@
+import random
+import pytest
+from map import Map
+from incremental import DStarLite
+from utils import Rotation
+from benchmark import random_board, random_queries
+
+
+# kept D* Lite searches must agree with a full search while walls appear
+# and allies move, agents walk their route in between
+@pytest.mark.parametrize("n", [8, 16, 32])
+@pytest.mark.parametrize("seed", range(5))
+def test_agrees_with_full_search(n, seed):
+    rng = random.Random(seed)
+    game_map, _ = random_queries(n, seed, 0)
+    walls = bytearray(game_map.walls)
+    allies = bytearray(game_map.ally_mask)
+    free = [cell for cell in range(n * n) if not walls[cell]]
+    target = divmod(rng.choice(free), n)
+    paths = DStarLite(n, target)
+    start, start_rot = divmod(rng.choice(free), n), rng.choice(list(Rotation))
+    for _ in range(30):
+        if rng.random() < 0.5:
+            for _ in range(rng.randrange(1, 4)):
+                cell = rng.randrange(n * n)
+                mask = walls if rng.random() < 0.5 else allies
+                mask[cell] ^= 1
+                paths.pending.add(cell)
+        if walls[start[0] * n + start[1]]:
+            start = divmod(rng.choice([cell for cell in range(n * n) if not walls[cell]]), n)
+        step = paths.first_step(walls, allies, start, start_rot)
+        expected = game_map.pathfinder.search(walls, allies, start, start_rot, target)[1]
+        distance = paths.g[(start[0] * n + start[1]) * 4 + start_rot.value]
+        if start == target:
+            start = divmod(rng.choice(free), n)
+            continue
+        assert (expected is None) == (step is None), (start, start_rot, target)
+        if step is None:
+            continue
+        assert distance == expected, (start, start_rot, target, distance, expected)
+        # the step must keep a shortest path
+        rot = next(rot for rot in Rotation if game_map.adjacent(start, rot) == step)
+        turn = 0 if rot == start_rot else 1
+        after = game_map.pathfinder.search(walls, allies, step, rot, target)[1]
+        assert turn + 1 + (after or 0) == expected or step == target, (start, step)
+        # walk the route, teleport sometimes
+        walked = rng.random() < 0.8
+        start, start_rot = (step, rot) if walked else (divmod(rng.choice(free), n), start_rot)
+
+
+# a search is kept only for targets asked on consecutive turns, and no
+# more than max_paths of them
+def test_kept_searches():
+    n = 16
+    game_map = random_board(Map(n, (0, 0), []), fog=0.0, walls=0.1, gold=0.0)
+    free = [divmod(cell, n) for cell in range(n * n) if not game_map.walls[cell]]
+    start, targets = free[0], free[1:4]
+    game_map.max_paths = 2
+    for target in targets:
+        game_map.incremental_step(start, Rotation.U, target)
+    assert not game_map.paths
+    game_map.update([])
+    for target in targets:
+        game_map.incremental_step(start, Rotation.U, target)
+    assert list(game_map.paths) == targets[1:]
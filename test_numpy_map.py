@@ -0,0 +1,23 @@
+import pytest
+from map import Map
+from numpy_map import NumpyMap, HAS_NUMPY
+from utils import Tile
+from benchmark import random_board
+
+pytestmark = pytest.mark.skipif(not HAS_NUMPY, reason="numpy is not installed")
+
+
+# board queries on the int8 board answer the same as the TileIndex
+@pytest.mark.parametrize("seed", range(5))
+def test_same_answers_as_map(seed):
+    n = 24
+    maps = [random_board(backend(n, (0, 0), []), seed=seed) for backend in (Map, NumpyMap)]
+    for game_map in maps:
+        game_map.clear_fog((n // 2, n // 2), n // 4)
+    plain, vectorized = maps
+    assert plain.board == vectorized.board
+    for tile in Tile:
+        assert plain.count_on_board(tile) == vectorized.count_on_board(tile)
+        assert sorted(plain.find_all(tile)) == sorted(vectorized.find_all(tile))
+        for row, col in [(0, 0), (n // 2, n // 3), (n - 1, n - 1)]:
+            assert plain.find_closest(row, col, tile) == vectorized.find_closest(row, col, tile)
@@ -0,0 +1,20 @@
+from bot import Bot
+from profiler import Profiler
+from speculator import Speculator
+from flight_recorder import FlightRecorder
+
+
+# installers stacked on one bot and removed in reverse order leave the class
+# methods in place
+def test_uninstall_restores_methods(tmp_path):
+    bot = Bot(16, 100, 2, (0, 0), [])
+    installers = [Profiler(str(tmp_path / "profile")), Speculator(), FlightRecorder(str(tmp_path / "trace"))]
+    for installer in installers:
+        installer.install(bot)
+    assert "go" in vars(bot) and "command" in vars(bot)
+    for installer in reversed(installers):
+        installer.uninstall()
+    for name in ["go", "go_all", "command", "update"]:
+        assert name not in vars(bot)
+    for name in ["field", "safe_field", "incremental_step"]:
+        assert name not in vars(bot.map)
@@ -0,0 +1,34 @@
+import pytest
+from distance_field import DistanceField
+from utils import Rotation
+from benchmark import random_queries, reference_bfs
+
+
+# turns needed from start when the first move goes to first_tile
+def cost_through(game_map, field, start, start_rot, first_tile):
+    for rot in Rotation:
+        if game_map.adjacent(start, rot) == first_tile:
+            return (0 if rot == start_rot else 1) + 1 + field.distance(first_tile, rot)
+
+
+# pathfinder must find a shortest path whenever reference bfs finds a path
+@pytest.mark.parametrize("n", [8, 16, 32])
+@pytest.mark.parametrize("seed", range(5))
+def test_shortest_first_step(n, seed):
+    game_map, queries = random_queries(n, seed, 50)
+    for start, start_rot, target in queries:
+        if game_map.walls[start[0] * n + start[1]]:
+            continue
+        expected = reference_bfs(game_map, start, start_rot, target)
+        result = game_map.bfs(start, start_rot, target)
+        assert (expected is None) == (result is None), (start, start_rot, target)
+        if result is None:
+            continue
+        # reverse field treating allies other than target as walls
+        blocked = bytearray(a | b for a, b in zip(game_map.walls, game_map.ally_mask))
+        for row, col in (start, target):
+            blocked[row * n + col] = game_map.walls[row * n + col]
+        field = DistanceField(n, [target])
+        field.build(blocked)
+        best = field.distance(start, start_rot)
+        assert cost_through(game_map, field, start, start_rot, result) == best, (start, start_rot, target)
@@ -0,0 +1,54 @@
+import random
+import pytest
+from map import Map
+from bot import Bot
+from agent import Agent, Vision
+from agent_batch import AgentBatch
+from parallel_planner import ParallelPlanner
+from utils import Tile, Rotation
+from benchmark import random_board
+
+
+# go_all with a planner pool sends long routes on large maps over the
+# cluster graph, same steps as without the pool
+@pytest.mark.parametrize("n", [64])
+@pytest.mark.parametrize("seed", range(2))
+def test_pool_same_steps(n, seed, monkeypatch):
+    monkeypatch.setattr(Map, "CLUSTERS_MIN_N", 32)
+    rng = random.Random(seed)
+    bots = [Bot(n, 100, 2, (0, 0), []) for _ in range(2)]
+    for bot in bots:
+        random_board(bot.map, seed=seed, fog=0.0, gold=0.0)
+    free = [cell for cell in range(n * n) if not bots[0].map.walls[cell]]
+    pairs = []
+    agents = []
+    while len(pairs) < 16:
+        start, target = divmod(rng.choice(free), n), divmod(rng.choice(free), n)
+        if bots[0].map.over_clusters(start, target):
+            pairs.append((len(agents), target))
+            agents.append(Agent(*start, rng.choice(list(Rotation)), Vision(Tile.EMPTY, 1)))
+    agents = AgentBatch().load(agents)
+    bots[1].planner = ParallelPlanner(n, 2)
+    bots[1].planner.publish(bots[1].map)
+    try:
+        serial, pooled = [bot.go_all(agents, [None] * len(agents), pairs) for bot in bots]
+    finally:
+        bots[1].planner.close()
+    assert serial == pooled
+
+
+# long routes to a target with a built field take the field's step, the
+# cluster graph is only asked without one
+def test_built_field_before_clusters(monkeypatch):
+    monkeypatch.setattr(Map, "CLUSTERS_MIN_N", 32)
+    n = 64
+    game_map = random_board(Map(n, (0, 0), []), fog=0.0, gold=0.0)
+    free = [divmod(cell, n) for cell in range(n * n) if not game_map.walls[cell]]
+    start = next(cords for cords in reversed(free) if game_map.over_clusters(cords, (0, 0)))
+    clustered = []
+    monkeypatch.setattr(game_map, "cluster_step", lambda *args: clustered.append(args))
+    game_map.path_step(start, Rotation.U, (0, 0))
+    assert len(clustered) == 1
+    field = game_map.field((0, 0))
+    assert game_map.path_step(start, Rotation.U, (0, 0)) == field.next_tile(start, Rotation.U)
+    assert len(clustered) == 1
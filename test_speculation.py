@@ -0,0 +1,51 @@
+import random
+import pytest
+from bot import Bot
+from agent import Agent, Vision
+from agent_batch import AgentBatch
+from speculator import Speculator
+from scheduler import Deadline
+from utils import Tile, Rotation
+
+
+# a speculated step must equal a fresh one after a wall appears on it and
+# another agent rebuilt the field before the speculated agent asks
+@pytest.mark.parametrize("n", [16, 32])
+@pytest.mark.parametrize("seed", range(10))
+def test_plan_hit_by_new_wall(n, seed, monkeypatch):
+    monkeypatch.setattr(Bot, "TURN_BUDGET", None)
+    rng = random.Random(seed)
+    base = (rng.randrange(n), rng.randrange(n))
+    bot = Bot(n, 100, 2, base, [])
+    for row in range(n):
+        for col in range(n):
+            if (row, col) != base:
+                bot.map.set_tile(row, col, Tile.WALL if rng.random() < 0.1 else Tile.EMPTY)
+    bot.map.publish()
+    speculator = Speculator().install(bot)
+    agents = AgentBatch().load([
+        Agent(rng.randrange(n), rng.randrange(n), rng.choice(list(Rotation)), Vision(Tile.EMPTY, 1))
+        for _ in range(2)
+    ])
+    agent = agents[1]
+    start = (agent.row, agent.col)
+    if bot.map.walls[start[0] * n + start[1]] or start == base:
+        pytest.skip("agent starts on a wall or on the base")
+    # the worker never builds a field, the real turn does
+    assert speculator.plan(start, agent.rot, base, False, Deadline(None)) is None
+    assert bot.map.needs_build(base)
+    bot.map.field(base)
+    plan = speculator.plan(start, agent.rot, base, False, Deadline(None))
+    if plan.step is None or plan.step == base:
+        pytest.skip("no step to put a wall on")
+    speculator.plans[1] = plan
+    bot.map.set_tile(*plan.step, Tile.WALL)
+    bot.map.publish()
+    # agent 0 rebuilds the field first
+    bot.map.field(base)
+    speculated = bot.go(agent, base)
+    speculator.uninstall()
+    # the first go reserved its step
+    bot.map.reset_agent_board()
+    fresh = bot.go(agent, base)
+    assert speculated == fresh, (start, plan.step, speculated, fresh)
@@ -0,0 +1,21 @@
+import pytest
+from map import Map
+from agent import Agent, Vision
+from utils import Tile, Rotation
+
+
+# a tile on the line of sight is cleared even when the tile at the end
+# of the line is already empty
+@pytest.mark.parametrize("n", [4, 8, 16])
+@pytest.mark.parametrize("tile", [Tile.GOLD, Tile.FOG])
+@pytest.mark.parametrize("end", [Tile.EMPTY, Tile.ENEMY, Tile.WALL])
+def test_line_of_sight_cleared(n, tile, end):
+    for far in range(2, n):
+        game_map = Map(n, (n - 1, n - 1), [])
+        for col in range(far + 1):
+            game_map.set_tile(0, col, Tile.EMPTY)
+        game_map.set_tile(0, 1, tile)
+        game_map.publish()
+        game_map.update([Agent(0, 0, Rotation.R, Vision(end, far))])
+        assert game_map.board[0][1] == Tile.EMPTY, far
+        assert (0, 1) not in game_map.find_all(Tile.GOLD), far
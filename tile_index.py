@@ -0,0 +1,99 @@
+from utils import Tile
+from itertools import product
+import math
+
+
+# Live index of board cords per tile type, kept in sync by Map.publish.
+# Cords are additionally grouped in square buckets so nearest-of-type
+# queries only look at buckets around the query point.
+class TileIndex:
+    BUCKET_SIZE = 8
+
+    def __init__(self, n, fill):
+        self.n = n
+        size = TileIndex.BUCKET_SIZE
+        self.n_buckets = (n + size - 1) // size
+        self.cells = [set() for _ in Tile]
+        self.buckets = [dict() for _ in Tile]
+        # every cell starts as fill, built bucket by bucket
+        buckets = self.buckets[fill]
+        for key in product(range(self.n_buckets), repeat=2):
+            rows = range(key[0] * size, min(n, (key[0] + 1) * size))
+            cols = range(key[1] * size, min(n, (key[1] + 1) * size))
+            buckets[key] = set(product(rows, cols))
+        self.cells[fill] = set().union(*buckets.values())
+
+    def bucket(self, cords):
+        return (cords[0] // TileIndex.BUCKET_SIZE, cords[1] // TileIndex.BUCKET_SIZE)
+
+    def add(self, cords, tile):
+        self.cells[tile].add(cords)
+        key = self.bucket(cords)
+        bucket = self.buckets[tile].get(key)
+        if bucket is None:
+            bucket = self.buckets[tile][key] = set()
+        bucket.add(cords)
+
+    def remove(self, cords, tile):
+        self.cells[tile].discard(cords)
+        key = self.bucket(cords)
+        bucket = self.buckets[tile].get(key)
+        if bucket is not None:
+            bucket.discard(cords)
+            if not bucket:
+                del self.buckets[tile][key]
+
+    def move(self, cords, old_tile, new_tile):
+        self.remove(cords, old_tile)
+        self.add(cords, new_tile)
+
+    # subscriber of Map change sets
+    def apply(self, changes):
+        for cell, old_tile, tile in changes.tiles:
+            self.move(divmod(cell, self.n), old_tile, tile)
+
+    def count(self, tile):
+        return len(self.cells[tile])
+
+    # row major order, same as scanning the board
+    def all(self, tile):
+        return sorted(self.cells[tile])
+
+    # returns (None, math.inf) if cannot find
+    # ties are broken by row major order, same as scanning the board
+    def closest(self, row, col, tile):
+        buckets = self.buckets[tile]
+        if not buckets:
+            return None, math.inf
+        size = TileIndex.BUCKET_SIZE
+        center_row, center_col = row // size, col // size
+        best = None
+        best_dist = math.inf
+        for ring in range(self.n_buckets):
+            # every cell in this ring is at least this far away
+            if ring > 0 and (ring - 1) * size + 1 > best_dist:
+                break
+            for key in self.ring(center_row, center_col, ring):
+                for cords in buckets.get(key, ()):
+                    dist = abs(cords[0] - row) + abs(cords[1] - col)
+                    if dist < best_dist or (dist == best_dist and cords < best):
+                        best = cords
+                        best_dist = dist
+        return best, best_dist
+
+    # bucket keys at chebyshev distance ring from center
+    def ring(self, center_row, center_col, ring):
+        if ring == 0:
+            return [(center_row, center_col)]
+        keys = []
+        for bucket_row in range(center_row - ring, center_row + ring + 1):
+            if bucket_row < 0 or bucket_row >= self.n_buckets:
+                continue
+            if abs(bucket_row - center_row) == ring:
+                cols = range(center_col - ring, center_col + ring + 1)
+            else:
+                cols = (center_col - ring, center_col + ring)
+            for bucket_col in cols:
+                if 0 <= bucket_col < self.n_buckets:
+                    keys.append((bucket_row, bucket_col))
+        return keys
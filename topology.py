@@ -0,0 +1,115 @@
+import os
+import logging
+from array import array
+
+# ahead[state] of a step off the map
+NO_CELL = -1
+
+
+# Tables that only depend on the map size, over (cell, rotation) states
+# encoded as (row * n + col) * 4 + rotation: ahead[state] is the cell one
+# step forward or NO_CELL at the map edge, so the cell behind a state is
+# ahead[state ^ 2], and edges[state] is the number of cells before the
+# edge, what Rays.free starts with. They are built with slice assignments
+# and can be kept on disk in CACHE_DIR, one file per n loaded in one read.
+class Topology:
+    # directory of cached tables, None to always build them
+    CACHE_DIR = None
+    # bump when the layout of the tables changes
+    VERSION = 1
+
+    def __init__(self, n, ahead, edges):
+        self.n = n
+        self.ahead = ahead
+        self.edges = edges
+
+    @classmethod
+    def build(cls, n):
+        size = n * n
+        none = array("i", [NO_CELL]) * n
+        up = array("i", range(-n, size - n))
+        up[0:n] = none
+        right = array("i", range(1, size + 1))
+        right[n - 1::n] = none
+        down = array("i", range(n, size + n))
+        down[size - n:size] = none
+        left = array("i", range(-1, size - 1))
+        left[0::n] = none
+        ahead = array("i", bytes(16 * size))
+        edges = array("i", bytes(16 * size))
+        rows = array("i")
+        for row in range(n):
+            rows.extend(array("i", [row]) * n)
+        cols = array("i", range(n)) * n
+        for rot, (cells, edge) in enumerate((
+            (up, rows),
+            (right, array("i", range(n - 1, -1, -1)) * n),
+            (down, array("i", reversed(rows))),
+            (left, cols),
+        )):
+            ahead[rot::4] = cells
+            edges[rot::4] = edge
+        return cls(n, ahead, edges)
+
+    @classmethod
+    def path(cls, n):
+        return os.path.join(cls.CACHE_DIR, f"topology-{n}-v{cls.VERSION}.bin")
+
+    # None if there is no cached file for n or it is broken
+    @classmethod
+    def load(cls, n):
+        try:
+            with open(cls.path(n), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        half = 16 * n * n
+        if len(data) != 2 * half:
+            return None
+        ahead = array("i")
+        ahead.frombytes(data[:half])
+        edges = array("i")
+        edges.frombytes(data[half:])
+        return cls(n, ahead, edges)
+
+    # written to a temporary file first, so concurrent launches never read
+    # half a file
+    def save(self):
+        path = self.path(self.n)
+        temporary = f"{path}.{os.getpid()}"
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            with open(temporary, "wb") as file:
+                file.write(self.ahead.tobytes() + self.edges.tobytes())
+            os.replace(temporary, path)
+        except OSError as e:
+            logging.warning(f"cannot cache topology tables in {path}: {e}")
+
+    # flat mask of the cells within manhattan distance radius of center
+    def diamond(self, center, radius):
+        n = self.n
+        mask = bytearray(n * n)
+        for row in range(max(0, center[0] - radius), min(n, center[0] + radius + 1)):
+            width = radius - abs(row - center[0])
+            first = row * n + max(0, center[1] - width)
+            end = row * n + min(n, center[1] + width + 1)
+            mask[first:end] = b"\x01" * (end - first)
+        return mask
+
+
+# n -> Topology, shared by everything in this process
+tables = dict()
+
+
+def topology(n):
+    result = tables.get(n)
+    if result is not None:
+        return result
+    if Topology.CACHE_DIR is not None:
+        result = Topology.load(n)
+    if result is None:
+        result = Topology.build(n)
+        if Topology.CACHE_DIR is not None:
+            result.save()
+    tables[n] = result
+    return result
@@ -1,7 +1,8 @@
-from enum import Enum
+from enum import Enum, IntEnum
 from dataclasses import dataclass
 
-class Tile(Enum):
+# IntEnum so tiles can be stored in and compared with int8 and byte arrays
+class Tile(IntEnum):
     FOG = 0
     EMPTY = 1
     WALL = 2
@@ -33,3 +34,10 @@ class Command(Enum):
     LEFT = 3
     RIGHT = 4
     BACK = 5
+
+
+# (row, col) step for each rotation, indexed by Rotation.value
+DIRECTIONS = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+
+# rotation difference (new - old) % 4 -> command turning that way
+TURN_COMMANDS = [None, Command.RIGHT, Command.BACK, Command.LEFT]